@@ -0,0 +1,369 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+
+# Benchmark voor de OCR-pipeline: bouwt een deterministisch corpus van synthetische screenshots,
+# stuurt ze door dezelfde run_ocr die de OCR-workers van /api/photos/process-all gebruiken
+# en rapporteert doorvoer, latency, piekgeheugen en karakter-nauwkeurigheid.
+#
+# Gebruik (vanuit .github/back-end): eerst een referentie op de huidige code, dan na de wijziging vergelijken
+#   python3 benchmarks/ocr_benchmark.py --output /tmp/ocr-baseline.json
+#   python3 benchmarks/ocr_benchmark.py --baseline /tmp/ocr-baseline.json
+# Doorvoer en latency hangen af van de machine: vergelijk enkel runs op dezelfde machine met dezelfde instellingen
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from services.ocr import init_ocr_process, run_ocr  # noqa: E402
+from services.ocr_backends import get_ocr_backend_name  # noqa: E402
+from services.ocr_tiling import OCR_TILE_WORKERS  # noqa: E402
+
+# Schermformaten (breedte, hoogte) van de gegenereerde screenshots
+SIZES = {
+    "small": (750, 1334),
+    "phone": (1170, 2532),
+    "tablet": (1640, 2360),
+    "scroll": (1170, 9000),
+}
+
+# Zinnen per taal voor chats, tickets en kassabonnen
+PHRASES = {
+    "eng": [
+        "Are you coming to the meeting tomorrow",
+        "I just sent you the invoice for last month",
+        "Can you call me back when you have time",
+        "The train is delayed by twenty minutes",
+        "Thanks for your help with the project",
+        "Do not forget to bring the documents",
+        "What time does the store open on Sunday",
+        "Your package will be delivered this afternoon",
+    ],
+    "nld": [
+        "Kom je morgen ook naar de vergadering",
+        "Ik heb je de factuur van vorige maand gestuurd",
+        "Kan je me terugbellen als je tijd hebt",
+        "De trein heeft twintig minuten vertraging",
+        "Bedankt voor je hulp met het project",
+        "Vergeet de documenten niet mee te nemen",
+        "Hoe laat gaat de winkel open op zondag",
+        "Je pakket wordt vanmiddag geleverd",
+    ],
+    "fra": [
+        "Tu viens à la réunion demain",
+        "Je viens de t'envoyer la facture du mois dernier",
+        "Tu peux me rappeler quand tu as le temps",
+        "Le train a vingt minutes de retard",
+        "Merci pour ton aide avec le projet",
+        "N'oublie pas d'apporter les documents",
+        "À quelle heure ouvre le magasin dimanche",
+        "Ton colis sera livré cet après-midi",
+    ],
+}
+
+ITEMS = ["Coffee", "Bread", "Milk", "Cheese", "Apples", "Water", "Pasta", "Tomatoes", "Butter", "Eggs"]
+
+
+def _load_font(size: int):
+    # DejaVu als die aanwezig is, anders het ingebouwde lettertype van Pillow
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", size)
+    except OSError:
+        return ImageFont.load_default(size=size)
+
+
+def _render(size, dark: bool, blocks):
+    # Teken tekstblokken (x, y, tekst, fontgrootte, gevuld kader) en geef de afbeelding + grondwaarheid terug
+    background, foreground, bubble = ((18, 18, 18), (235, 235, 235), (48, 48, 52)) if dark else ((255, 255, 255), (20, 20, 20), (229, 229, 234))
+    img = Image.new("RGB", size, background)
+    draw = ImageDraw.Draw(img)
+    truth = []
+
+    for x, y, text, font_size, boxed in blocks:
+        font = _load_font(font_size)
+        if boxed:
+            left, top, right, bottom = draw.textbbox((x, y), text, font=font)
+            draw.rounded_rectangle((left - 24, top - 18, right + 24, bottom + 18), radius=28, fill=bubble)
+        draw.text((x, y), text, font=font, fill=foreground)
+        truth.append(text)
+
+    return img, "\n".join(truth)
+
+
+def _chat_blocks(rng, size, lang):
+    width, height = size
+    scale = width / 390
+    blocks = [(int(20 * scale), int(60 * scale), rng.choice(["Alex", "Sam", "Jordi", "Noor", "Camille"]), int(17 * scale), False)]
+    y = int(120 * scale)
+    while y < height - int(80 * scale):
+        text = rng.choice(PHRASES[lang])
+        outgoing = rng.random() < 0.5
+        x = int((120 if outgoing else 24) * scale)
+        blocks.append((x, y, text if len(text) < 30 else text[:30].rstrip(), int(15 * scale), True))
+        blocks.append((x, y + int(32 * scale), f"{rng.randint(7, 22):02d}:{rng.randint(0, 59):02d}", int(11 * scale), False))
+        y += int(rng.choice([70, 80, 90]) * scale)
+    return blocks
+
+
+def _ticket_blocks(rng, size, lang):
+    width, height = size
+    scale = width / 390
+    blocks = [(int(24 * scale), int(60 * scale), f"Ticket #{rng.randint(10000, 99999)}", int(22 * scale), False)]
+    y = int(120 * scale)
+    for label in ["Status", "Priority", "Assignee", "Created"]:
+        value = rng.choice(["Open", "High", "Support", f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"])
+        blocks.append((int(24 * scale), y, f"{label}: {value}", int(15 * scale), False))
+        y += int(34 * scale)
+    while y < height - int(80 * scale):
+        blocks.append((int(24 * scale), y, rng.choice(PHRASES[lang]), int(13 * scale), False))
+        y += int(30 * scale)
+    return blocks
+
+
+def _receipt_blocks(rng, size, lang):
+    width, height = size
+    scale = width / 390
+    blocks = [(int(120 * scale), int(50 * scale), "SUPERMARKET", int(20 * scale), False)]
+    y = int(110 * scale)
+    total = 0.0
+    while y < min(height - int(140 * scale), int(900 * scale)):
+        price = rng.randint(50, 1500) / 100
+        total += price
+        blocks.append((int(30 * scale), y, f"{rng.choice(ITEMS)} {price:.2f}", int(15 * scale), False))
+        y += int(30 * scale)
+    blocks.append((int(30 * scale), y + int(20 * scale), f"TOTAL {total:.2f}", int(18 * scale), False))
+    return blocks
+
+
+TEMPLATES = {
+    "chat": _chat_blocks,
+    "ticket": _ticket_blocks,
+    "receipt": _receipt_blocks,
+}
+
+
+def build_corpus(seed: int, per_combination: int, sizes: list, languages: list):
+    # Bouw het corpus: elke combinatie van sjabloon, formaat en taal, deterministisch via de seed
+    rng = random.Random(seed)
+    corpus = []
+    for template_name, template in TEMPLATES.items():
+        for size_name in sizes:
+            for lang in languages:
+                for index in range(per_combination):
+                    dark = rng.random() < 0.4
+                    img, truth = _render(SIZES[size_name], dark, template(rng, SIZES[size_name], lang))
+                    buffer = io.BytesIO()
+                    img.save(buffer, format="PNG")
+                    corpus.append({
+                        "name": f"{template_name}-{size_name}-{lang}-{index}{'-dark' if dark else ''}",
+                        "template": template_name,
+                        "size": size_name,
+                        "language": lang,
+                        "imageData": buffer.getvalue(),
+                        "truth": truth,
+                    })
+    return corpus
+
+
+def character_accuracy(truth: str, text: str) -> float:
+    # Aandeel karakters van de grondwaarheid dat in de OCR-tekst (in volgorde) teruggevonden wordt
+    truth = " ".join(truth.split())
+    text = " ".join(text.split())
+    if not truth:
+        return 1.0
+    matcher = SequenceMatcher(None, truth, text, autojunk=False)
+    matched = sum(block.size for block in matcher.get_matching_blocks())
+    return matched / len(truth)
+
+
+def percentile(values: list, pct: float) -> float:
+    # Nearest-rank percentiel
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _timed_ocr(image_data: bytes, preprocess_profile: str, language_profile: str):
+    # Draait in een worker-process: meet de latency van één afbeelding rond run_ocr
+    start = time.perf_counter()
+    text, meta = run_ocr(image_data, preprocess_profile, language_profile)
+    return text, meta, (time.perf_counter() - start) * 1000
+
+
+def run_benchmark(corpus: list, workers: int, preprocess_profile: str, language_profile: str):
+    # Verwerk het corpus met een process pool zoals de OCR-workers en verzamel per afbeelding de resultaten
+    # Strook-threads zoals in de OCR-pool: vast, of automatisch naargelang hoeveel taken er tegelijk lopen
+    active_tasks = None if OCR_TILE_WORKERS else multiprocessing.Value("i", 0)
+    initargs = (("eng", "eng+nld"), OCR_TILE_WORKERS or os.cpu_count() or 1, active_tasks)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_ocr_process, initargs=initargs) as executor:
+        # Opwarmen buiten de meting: pool starten en modellen laden
+        list(executor.map(_timed_ocr, [corpus[0]["imageData"]] * workers, [preprocess_profile] * workers, [language_profile] * workers))
+
+        start = time.perf_counter()
+        futures = [executor.submit(_timed_ocr, item["imageData"], preprocess_profile, language_profile) for item in corpus]
+        results = []
+        for item, future in zip(corpus, futures):
+            text, meta, latency_ms = future.result()
+            results.append({
+                "name": item["name"],
+                "template": item["template"],
+                "size": item["size"],
+                "language": item["language"],
+                "latencyMs": round(latency_ms, 1),
+                "accuracy": round(character_accuracy(item["truth"], text), 4),
+                "detectedLanguages": meta.get("languages"),
+                "tiles": meta.get("tiles"),
+            })
+        wall_seconds = time.perf_counter() - start
+
+    return results, wall_seconds
+
+
+def summarize(results: list, wall_seconds: float) -> dict:
+    # Vat de metingen samen; ru_maxrss is in KB op Linux
+    latencies = [r["latencyMs"] for r in results]
+    peak_rss_kb = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    by_template = {}
+    for template in sorted({r["template"] for r in results}):
+        subset = [r for r in results if r["template"] == template]
+        by_template[template] = {
+            "p50LatencyMs": percentile([r["latencyMs"] for r in subset], 50),
+            "accuracy": round(sum(r["accuracy"] for r in subset) / len(subset), 4),
+        }
+
+    return {
+        "images": len(results),
+        "wallSeconds": round(wall_seconds, 2),
+        "imagesPerSecond": round(len(results) / wall_seconds, 3) if wall_seconds else 0,
+        "p50LatencyMs": percentile(latencies, 50),
+        "p95LatencyMs": percentile(latencies, 95),
+        "p99LatencyMs": percentile(latencies, 99),
+        "peakRssMb": round(peak_rss_kb / 1024, 1),
+        "accuracy": round(sum(r["accuracy"] for r in results) / len(results), 4) if results else 0,
+        "byTemplate": by_template,
+    }
+
+
+def describe_machine() -> dict:
+    # Machine en softwareversies, zodat een baseline enkel met een vergelijkbare run vergeleken wordt
+    try:
+        tesseract_version = str(pytesseract.get_tesseract_version())
+    except Exception:
+        tesseract_version = None
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpuCount": os.cpu_count(),
+        "python": platform.python_version(),
+        "tesseract": tesseract_version,
+    }
+
+
+def compare_to_baseline(summary: dict, baseline: dict, tolerance: float) -> list:
+    # Geef een lijst van regressies t.o.v. de baseline (leeg = geen regressie)
+    regressions = []
+    base = baseline["summary"]
+
+    if summary["imagesPerSecond"] < base["imagesPerSecond"] * (1 - tolerance):
+        regressions.append(f"throughput {summary['imagesPerSecond']} < {base['imagesPerSecond']} images/sec")
+    for key in ("p50LatencyMs", "p95LatencyMs", "p99LatencyMs"):
+        if summary[key] > base[key] * (1 + tolerance):
+            regressions.append(f"{key} {summary[key]} > {base[key]}")
+    if summary["peakRssMb"] > base["peakRssMb"] * (1 + tolerance):
+        regressions.append(f"peakRssMb {summary['peakRssMb']} > {base['peakRssMb']}")
+    if summary["accuracy"] < base["accuracy"] - 0.01:
+        regressions.append(f"accuracy {summary['accuracy']} < {base['accuracy']}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR throughput/latency benchmark on a synthetic screenshot corpus")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--per-combination", type=int, default=2, help="images per template/size/language combination")
+    parser.add_argument("--sizes", default="small,phone,scroll", help=f"comma-separated, from {','.join(SIZES)}")
+    parser.add_argument("--languages", default="eng,nld,fra")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--preprocess-profile", default=None)
+    parser.add_argument("--ocr-language", default=None, help="OCR language profile (default: server default)")
+    parser.add_argument("--corpus-dir", default=None, help="also write the corpus PNGs and ground truth here")
+    parser.add_argument("--output", default=None, help="write results as JSON (usable as a baseline)")
+    parser.add_argument("--baseline", default=None, help="compare against a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression vs the baseline")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.seed, args.per_combination, args.sizes.split(","), args.languages.split(","))
+    print(f"Corpus: {len(corpus)} images (seed {args.seed}), backend: {get_ocr_backend_name()}, workers: {args.workers}")
+
+    if args.corpus_dir:
+        os.makedirs(args.corpus_dir, exist_ok=True)
+        for item in corpus:
+            with open(os.path.join(args.corpus_dir, f"{item['name']}.png"), "wb") as f:
+                f.write(item["imageData"])
+            with open(os.path.join(args.corpus_dir, f"{item['name']}.txt"), "w", encoding="utf-8") as f:
+                f.write(item["truth"])
+
+    results, wall_seconds = run_benchmark(corpus, args.workers, args.preprocess_profile, args.ocr_language)
+    summary = summarize(results, wall_seconds)
+    print(json.dumps(summary, indent=2))
+
+    report = {
+        "config": {
+            "seed": args.seed,
+            "perCombination": args.per_combination,
+            "sizes": args.sizes,
+            "languages": args.languages,
+            "workers": args.workers,
+            "tileWorkers": OCR_TILE_WORKERS or "auto",
+            "preprocessProfile": args.preprocess_profile,
+            "ocrLanguage": args.ocr_language,
+            "backend": get_ocr_backend_name(),
+        },
+        "machine": describe_machine(),
+        "summary": summary,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        # Een andere machine of andere instellingen maken de vergelijking zinloos: wel tonen, maar waarschuwen
+        for section in ("config", "machine"):
+            differences = sorted(
+                key for key in set(report[section]) | set(baseline.get(section, {}))
+                if report[section].get(key) != baseline.get(section, {}).get(key)
+            )
+            if differences:
+                print(f"Warning: baseline {section} differs ({', '.join(differences)}); results may not be comparable")
+        regressions = compare_to_baseline(summary, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSION against baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("No regression against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
+import multiprocessing
+import os
 from flask import Flask, jsonify
 from flask_cors import CORS
+from werkzeug.serving import is_running_from_reloader
 from routes.extract_text import ocr_bp
 from routes.auth_routes import auth_bp
 from routes.upload_routes import upload_bp
 from routes.admin_routes import admin_bp
+from auth_backend import start_inline_ocr_worker, start_photo_purger, start_photo_archiver, start_migrations
+from utils.uploads import UploadRequest, UPLOAD_MAX_REQUEST_BYTES
 
 # Maakt de hoofd-Flask-app aan
 app = Flask(__name__)
 
+# Uploads streamen naar (gespoolde) tijdelijke bestanden met een limiet per bestand en per request
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_REQUEST_BYTES
+
 # Activeert CORS voor alle routes (frontend kan nu requests maken)
 CORS(app, supports_credentials=True, origins=["http://localhost:5173"], allow_headers=["Content-Type", "Authorization", "X-User-ID"])
 
@@ -26,10 +35,39 @@ def internal_error(error):
 def not_found(error):
     return jsonify({"error": "Endpoint not found", "details": str(error)}), 404
 
+@app.errorhandler(413)
+def request_entity_too_large(error):
+    return jsonify({"error": "Upload too large", "details": str(error)}), 413
+
 @app.errorhandler(405)
 def method_not_allowed(error):
     return jsonify({"error": "Method not allowed", "details": str(error)}), 405
 
+def start_background_workers():
+    # Start de OCR-worker zodat jobs van voor een herstart meteen verder lopen
+    start_inline_ocr_worker()
+    # Opruimen dat voor een herstart onderbroken werd verderzetten
+    start_photo_purger()
+    # Oude foto's periodiek naar de archieflaag verplaatsen
+    start_photo_archiver()
+    # Openstaande (of onderbroken) datamigraties verderzetten
+    start_migrations()
+
+# Onder een WSGI-server (bv. gunicorn) start de server zelf de achtergrondtaken: APP_START_WORKERS=true
+# (niet in de OCR-poolprocessen, die deze module opnieuw kunnen importeren)
+if (
+    os.environ.get("APP_START_WORKERS", "false").lower() == "true"
+    and __name__ != "__main__"
+    and multiprocessing.parent_process() is None
+):
+    start_background_workers()
+
 if __name__ == "__main__":
-    # Start de app lokaal in debugmodus
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    debug = os.environ.get("FLASK_DEBUG", "true").lower() == "true"
+
+    # Zonder reloader meteen starten; met de debug-reloader enkel in het kindproces dat de requests afhandelt
+    if not debug or is_running_from_reloader():
+        start_background_workers()
+
+    # Start de app lokaal (standaard in debugmodus)
+    app.run(host="0.0.0.0", port=5000, debug=debug)
@@ -5,22 +5,67 @@ from services.users import (
     get_user_by_email,
     get_user_by_id,
     create_user,
+    get_user_ocr_language,
+    set_user_ocr_language,
 )
 # Importeer foto-gerelateerde helpers
+from services.image_metadata import extract_exif, extract_gps_coords, extract_image_metadata
 from services.photos import (
-    extract_exif,
-    extract_gps_coords,
     calculate_sha256,
     save_photo,
+    save_photos_batch,
+    is_valid_duplicate_policy,
+    find_duplicate_photo,
+    get_known_hashes,
+    register_photos_by_hash,
     get_user_photos,
     get_photo_by_id,
+    get_photo_file_info,
+    open_photo_file,
     get_photos_for_processing,
+    mark_photos_received,
+    get_photo_for_ocr,
     update_photo_status,
     get_photos_status,
     delete_user_photos,
-    migrate_missing_original_filenames,
+    recompress_photo_blobs,
+    start_photo_recompression,
+    load_photo_image_data,
     update_photo_pipeline_result,
 )
+# Opslagcodec voor originelen
+from services.storage_codec import STORAGE_CODEC
+# Thumbnails en previews
+from services.renditions import RENDITION_SIZES, is_valid_rendition_size
+# Versiebeheerde datamigraties
+from services.migrations import run_migrations, start_migrations, migrations_running, get_migration_report
+# Archieflaag voor oude foto's
+from services.photo_archive import archive_old_photos, restore_archived_photo, start_photo_archiver
+# Opruimen van verwijderde foto's in de achtergrond
+from services.photo_purge import start_photo_purger
+# Hervatbare uploads
+from services.upload_sessions import (
+    create_upload_session,
+    get_upload_session,
+    write_upload_chunk,
+    finalize_upload_session,
+    discard_upload_session,
+)
+# OCR-helpers (process pool en worker)
+from services.ocr_pool import (
+    submit_ocr,
+    run_ocr_worker,
+    start_inline_ocr_worker,
+    wake_ocr_workers,
+)
+# OCR-voorbewerking en taalprofielen
+from services.ocr_preprocess import is_valid_preprocess_profile
+from services.ocr_language import is_valid_language_profile
+# Duurzame OCR-wachtrij
+from services.ocr_jobs import (
+    enqueue_ocr_jobs,
+    claim_ocr_job,
+)
 # LLM-query helper
 from services.llm import query_ollama
 # Analyse-helpers
@@ -49,18 +94,56 @@ __all__ = [
     "get_user_by_email",
     "get_user_by_id",
     "create_user",
+    "get_user_ocr_language",
+    "set_user_ocr_language",
     "extract_exif",
     "extract_gps_coords",
+    "extract_image_metadata",
     "calculate_sha256",
     "save_photo",
+    "save_photos_batch",
+    "is_valid_duplicate_policy",
+    "find_duplicate_photo",
+    "get_known_hashes",
+    "register_photos_by_hash",
     "get_user_photos",
     "get_photo_by_id",
+    "get_photo_file_info",
+    "open_photo_file",
     "get_photos_for_processing",
+    "mark_photos_received",
+    "get_photo_for_ocr",
     "update_photo_status",
     "get_photos_status",
     "delete_user_photos",
-    "migrate_missing_original_filenames",
+    "run_migrations",
+    "start_migrations",
+    "migrations_running",
+    "get_migration_report",
+    "recompress_photo_blobs",
+    "start_photo_recompression",
+    "STORAGE_CODEC",
+    "load_photo_image_data",
     "update_photo_pipeline_result",
+    "RENDITION_SIZES",
+    "is_valid_rendition_size",
+    "start_photo_purger",
+    "archive_old_photos",
+    "restore_archived_photo",
+    "start_photo_archiver",
+    "create_upload_session",
+    "get_upload_session",
+    "write_upload_chunk",
+    "finalize_upload_session",
+    "discard_upload_session",
+    "submit_ocr",
+    "run_ocr_worker",
+    "start_inline_ocr_worker",
+    "wake_ocr_workers",
+    "is_valid_preprocess_profile",
+    "is_valid_language_profile",
+    "enqueue_ocr_jobs",
+    "claim_ocr_job",
     "query_ollama",
     "get_photos_for_analysis",
     "get_photos_for_analysis_limited",
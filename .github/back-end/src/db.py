@@ -1,8 +1,11 @@
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
 import os
 
 # Databaseverbinding
 MONGO_URI = os.environ.get("MONGO_URI", "mongodb://mongo:27017/dev5")
+# OCR-cache-items die zo lang niet meer gebruikt zijn, ruimt MongoDB zelf op
+OCR_CACHE_TTL_DAYS = int(os.environ.get("OCR_CACHE_TTL_DAYS", "90"))
 
 # Maak de client en selecteer de database
 client = MongoClient(MONGO_URI)
@@ -12,8 +15,34 @@ db = client["dev5"]
 users = db["users"]
 photos = db["photos"]
 summaries = db["summaries"]
+ocr_jobs = db["ocr_jobs"]
+ocr_cache = db["ocr_cache"]
+blobs = db["blobs"]
+# Koude laag: zware velden van gearchiveerde foto's (zelfde _id als in photos)
+photos_archive = db["photos_archive"]
+upload_sessions = db["upload_sessions"]
+# Voortgang en checkpoints van datamigraties (één document per versie)
+migrations = db["migrations"]
 
 # Indexen voor snellere queries
-photos.create_index([("userId", 1), ("uploadedAt", -1)])
+photos.create_index([("userId", 1), ("uploadedAt", -1), ("_id", -1)])
+# Vervangen door de index hierboven (met _id voor keyset-paginatie); op bestaande databases de oude weggooien
+try:
+    photos.drop_index("userId_1_uploadedAt_-1")
+except OperationFailure:
+    pass
 photos.create_index([("userId", 1), ("metadata.sha256Hash", 1)])
+photos.create_index([("deletedAt", 1)], sparse=True)
+photos.create_index([("imageStorage.blobRef.key", 1)])
+photos.create_index([("archivedAt", 1), ("uploadedAt", 1)])
 summaries.create_index([("userId", 1), ("createdAt", -1)])
+ocr_jobs.create_index([("photoId", 1)], unique=True)
+ocr_jobs.create_index([("status", 1), ("createdAt", 1), ("sizeBytes", -1)])
+ocr_jobs.create_index([("status", 1), ("leaseExpiresAt", 1)])
+ocr_cache.create_index([("sha256Hash", 1)])
+ocr_cache.create_index([("lastHitAt", 1)], expireAfterSeconds=OCR_CACHE_TTL_DAYS * 24 * 3600)
+summaries.create_index([("sourcePhotoIds", 1)])
+blobs.create_index([("state", 1), ("refCount", 1)])
+# Verlopen uploadsessies ruimt MongoDB zelf op
+upload_sessions.create_index([("expiresAt", 1)], expireAfterSeconds=0)
+upload_sessions.create_index([("userId", 1)])
@@ -0,0 +1,25 @@
+import signal
+import threading
+from auth_backend import run_ocr_worker, wake_ocr_workers
+
+# Losse OCR-worker: draait naast (of in plaats van) de worker in het webproces
+# Start met: python3 src/ocr_worker.py
+
+
+def main():
+    stop_event = threading.Event()
+
+    def handle_stop(signum, frame):
+        # Stop met nieuwe jobs claimen, lopende jobs worden nog afgewerkt
+        print(f"OCR worker received signal {signum}, finishing in-flight jobs")
+        stop_event.set()
+        wake_ocr_workers()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    run_ocr_worker(stop_event=stop_event)
+
+
+if __name__ == "__main__":
+    main()
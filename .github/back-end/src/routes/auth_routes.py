@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from auth_backend import get_user_by_email, create_user, verify_password, get_user_by_id
+from auth_backend import get_user_by_email, create_user, verify_password, get_user_by_id, set_user_ocr_language, is_valid_language_profile
 from bson import ObjectId
 
 # Maakt een blueprint aan voor auth-routes
@@ -98,7 +98,8 @@ def get_current_user():
             return jsonify({
                 "userId": str(user["_id"]),
                 "email": user.get("email"),
-                "isAdmin": user.get("isAdmin", False)
+                "isAdmin": user.get("isAdmin", False),
+                "ocrLanguage": user.get("ocrLanguage"),
             }), 200
         else:
             return jsonify({"error": "User not found"}), 404
@@ -112,6 +113,32 @@ def get_current_user():
             "details": str(e)
         }), 500
 
+@auth_bp.route("/api/me/ocr-language", methods=["PUT"])
+def update_ocr_language():
+    # Stelt het OCR-taalprofiel van de ingelogde gebruiker in (null = serverstandaard)
+    try:
+        user_id = check_auth(request)
+        if not user_id:
+            return jsonify({"error": "Unauthorized - no user ID provided"}), 401
+
+        data = request.get_json() or {}
+        language_profile = data.get("ocrLanguage")
+        if language_profile is not None and not is_valid_language_profile(language_profile):
+            return jsonify({"error": f"Unknown OCR language profile: {language_profile}"}), 400
+
+        if not set_user_ocr_language(user_id, language_profile):
+            return jsonify({"error": "User not found"}), 404
+
+        return jsonify({"ocrLanguage": language_profile}), 200
+    except Exception as e:
+        print(f"Update OCR language error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to update OCR language",
+            "details": str(e)
+        }), 500
+
 def check_auth(request):
     # Haal de user-id uit de X-User-Id header
     user_id = request.headers.get("X-User-Id")
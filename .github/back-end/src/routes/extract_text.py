@@ -1,6 +1,10 @@
-from flask import Blueprint, request, jsonify
-import pytesseract
-from PIL import Image
+from flask import Blueprint, Response, request, jsonify
+import json
+import queue
+import threading
+from services.ocr_pool import submit_ocr
+from services.ocr_preprocess import is_valid_preprocess_profile
+from services.ocr_language import is_valid_language_profile
 
 # Maakt een blueprint aan voor ocr-routes
 ocr_bp = Blueprint("ocr", __name__)
@@ -18,22 +22,40 @@ def extract_text():
     else:
         return jsonify({"error": "no file(s) uploaded"}), 400
 
-    results = []
+    # Optioneel voorbewerkingsprofiel (form-veld of query parameter)
+    preprocess_profile = request.form.get("preprocessProfile") or request.args.get("preprocessProfile")
+    if preprocess_profile and not is_valid_preprocess_profile(preprocess_profile):
+        return jsonify({"error": f"unknown preprocess profile: {preprocess_profile}"}), 400
+
+    # Optioneel taalprofiel, standaard wordt de taal per afbeelding gedetecteerd
+    language_profile = request.form.get("ocrLanguage") or request.args.get("ocrLanguage")
+    if language_profile and not is_valid_language_profile(language_profile):
+        return jsonify({"error": f"unknown ocr language profile: {language_profile}"}), 400
+
+    # Lees alle bestanden in zolang de request nog open is
+    uploads = [(i, f.filename, f.read()) for i, f in enumerate(files, start=1)]
 
-    for i, f in enumerate(files, start=1):
-        # Opent het bestand als afbeelding
-        img = Image.open(f.stream)
+    # Streaming: één NDJSON-regel per screenshot zodra die klaar is
+    if request.args.get("stream") == "ndjson" or "application/x-ndjson" in request.headers.get("Accept", ""):
+        return Response(
+            _stream_results(uploads, preprocess_profile, language_profile),
+            mimetype="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
-        # Haalt tekst uit de afbeelding, in Engels en Nederlands
-        raw_text = pytesseract.image_to_string(img, lang="eng+nld")
+    # Alle screenshots tegelijk in de OCR-pool, resultaten in de oorspronkelijke volgorde
+    # (de tekst komt al proper terug: geen extra newlines of dubbele spaties)
+    futures = [(i, filename, submit_ocr(data, preprocess_profile, language_profile)) for i, filename, data in uploads]
+
+    results = []
 
-        # Maakt de tekst proper: verwijdert extra newlines en dubbele spaties
-        clean_text = " ".join(raw_text.split())
+    for i, filename, future in futures:
+        clean_text, _meta = future.result()
 
         # Object per screenshot
         results.append({
             "index": i,
-            "filename": f.filename,
+            "filename": filename,
             "text": clean_text,
         })
 
@@ -44,6 +66,33 @@ def extract_text():
     # Bij meerdere afbeeldingen een lijst terugsturen
     return jsonify({"screenshots": results})
 
+
+def _stream_results(uploads, preprocess_profile, language_profile):
+    # Geef per screenshot een JSON-regel terug in de volgorde waarin de OCR klaar is
+    finished = queue.Queue()
+
+    def submit_all():
+        # Inplannen kan blokkeren op de globale OCR-limiet, dus in een aparte thread
+        for i, filename, data in uploads:
+            try:
+                future = submit_ocr(data, preprocess_profile, language_profile)
+                future.add_done_callback(lambda done, i=i, filename=filename: finished.put((i, filename, done)))
+            except Exception as e:
+                finished.put((i, filename, e))
+
+    threading.Thread(target=submit_all, daemon=True).start()
+
+    for _ in range(len(uploads)):
+        i, filename, outcome = finished.get()
+        record = {"index": i, "filename": filename}
+        try:
+            if isinstance(outcome, Exception):
+                raise outcome
+            record["text"], _meta = outcome.result()
+        except Exception as e:
+            record["error"] = str(e)
+        yield json.dumps(record) + "\n"
+
 # Simpele test route om te checken of de backend werkt
 @ocr_bp.route("/api/test")
 def test():
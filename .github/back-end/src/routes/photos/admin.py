@@ -6,22 +6,65 @@ from utils.auth import require_user_id
 photos_admin_bp = Blueprint("photos_admin", __name__)
 
 
+def _require_admin(req):
+    # Vereist een ingelogde admin; geeft (user_id, None) of (None, foutresponse) terug
+    user_id, err = require_user_id(req)
+    if err:
+        return None, err
+    if not auth_backend.check_admin_status(user_id):
+        return None, (jsonify({"error": "admin only"}), 403)
+    return user_id, None
+
+
+@photos_admin_bp.route("/api/admin/migrate-photos", methods=["GET"])
+def get_photo_migrations():
+    # Voortgang van alle datamigraties (status, checkpoint, verwerkt en nog te doen)
+    try:
+        user_id, err = _require_admin(request)
+        if err:
+            return err
+
+        return jsonify({
+            "running": auth_backend.migrations_running(),
+            "migrations": auth_backend.get_migration_report(),
+        }), 200
+    except Exception as e:
+        print(f"Migration status error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to retrieve migration status",
+            "details": str(e)
+        }), 500
+
+
 @photos_admin_bp.route("/api/admin/migrate-photos", methods=["POST"])
 def migrate_photos():
-    # Admin endpoint om ontbrekende originalFilename velden te migreren
+    # Admin endpoint om openstaande datamigraties in de achtergrond uit te voeren (?dryRun=true: enkel rapporteren)
     try:
-        # Haal user-id op uit request en valideer
-        user_id, err = require_user_id(request)
+        user_id, err = _require_admin(request)
         if err:
             return err
 
-        # Voer de migratie uit
-        updated_count = auth_backend.migrate_missing_original_filenames()
+        body = request.get_json(silent=True) or {}
+        dry_run = request.args.get("dryRun", "").lower() == "true" or bool(body.get("dryRun", False))
+        if dry_run:
+            # Niets schrijven: per migratie hoeveel documenten nog aangepast moeten worden en enkele voorbeelden
+            return jsonify({
+                "dryRun": True,
+                "migrations": auth_backend.get_migration_report(dry_run=True),
+            }), 200
+
+        if not auth_backend.start_migrations():
+            return jsonify({
+                "message": "Migrations are already running",
+                "migrations": auth_backend.get_migration_report(),
+            }), 409
 
         return jsonify({
-            "message": f"Migration complete: {updated_count} photos updated",
-            "updatedCount": updated_count,
-        }), 200
+            "message": "Migrations started",
+            "migrations": auth_backend.get_migration_report(),
+        }), 202
     except Exception as e:
         print(f"Migration error: {e}")
         import traceback
@@ -30,3 +73,50 @@ def migrate_photos():
             "error": "Migration failed",
             "details": str(e)
         }), 500
+
+
+@photos_admin_bp.route("/api/admin/recompress-photos", methods=["POST"])
+def recompress_photos():
+    # Admin endpoint om bestaande originelen in de achtergrond met de opslagcodec te hercoderen
+    try:
+        user_id, err = _require_admin(request)
+        if err:
+            return err
+
+        if auth_backend.STORAGE_CODEC == "none":
+            return jsonify({"error": "No storage codec configured (set STORAGE_CODEC)"}), 400
+
+        if not auth_backend.start_photo_recompression():
+            return jsonify({"message": "Recompression is already running"}), 409
+
+        return jsonify({"message": f"Recompression with {auth_backend.STORAGE_CODEC} started"}), 202
+    except Exception as e:
+        print(f"Recompression error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Recompression failed",
+            "details": str(e)
+        }), 500
+
+
+@photos_admin_bp.route("/api/admin/archive-photos", methods=["POST"])
+def archive_photos():
+    # Admin endpoint om de archiver meteen te laten kijken in plaats van op het volgende interval te wachten
+    try:
+        user_id, err = _require_admin(request)
+        if err:
+            return err
+
+        if not auth_backend.start_photo_archiver():
+            return jsonify({"error": "Archiving is disabled (PHOTO_ARCHIVE_AFTER_DAYS=0)"}), 400
+
+        return jsonify({"message": "Archiving started"}), 202
+    except Exception as e:
+        print(f"Archive error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Archiving failed",
+            "details": str(e)
+        }), 500
@@ -1,11 +1,20 @@
-from flask import Blueprint, request, jsonify, send_file
-from io import BytesIO
+import re
+from flask import Blueprint, Response, request, jsonify, send_file
+from werkzeug.exceptions import RequestEntityTooLarge
 import auth_backend
 from utils.auth import require_user_id
+from utils.pagination import get_page_args
+from utils.uploads import get_upload_digest
 
 # Blueprint voor foto-bestandsroutes
 files_bp = Blueprint("files", __name__)
 
+# Hash-precheck: maximaal aantal hashes per request en het formaat van een SHA-256 in hex
+MAX_HASHES_PER_REQUEST = 1000
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+# Foto's zijn privé maar onveranderlijk: de browser mag ze een jaar bewaren zonder opnieuw te valideren
+PHOTO_FILE_MAX_AGE = 365 * 24 * 3600
+
 @files_bp.route("/api/photos", methods=["POST"])
 def upload_photos():
     try:
@@ -32,48 +41,66 @@ def upload_photos():
             print("Upload failed: No files selected")
             return jsonify({"error": "No files selected"}), 400
 
-        uploaded_photos = []
+        # Wat te doen met afbeeldingen die de gebruiker al heeft (link, reject of allow)
+        duplicate_policy = request.form.get("duplicatePolicy") or request.args.get("duplicatePolicy")
+        if duplicate_policy and not auth_backend.is_valid_duplicate_policy(duplicate_policy):
+            return jsonify({"error": f"Unknown duplicate policy: {duplicate_policy}"}), 400
 
+        # De bestanden zijn al gehasht en gespoold tijdens het ontvangen; niet in het geheugen inlezen
+        uploads = []
         for file in files:
             if file.filename == "":
                 continue
+            digest = get_upload_digest(file)
+            print(f"File received: {file.filename}, {digest[1]} bytes, MIME type: {file.mimetype}")
+            uploads.append({
+                "originalFilename": file.filename,
+                "imageData": file.stream,
+                "mimeType": file.mimetype or "image/jpeg",
+                "digest": digest,
+            })
 
-            try:
-                print(f"Processing file: {file.filename}")
-                # Lees binaire data en bepaal MIME type
-                image_data = file.read()
-                mime_type = file.mimetype or "image/jpeg"
-                print(f"File read: {len(image_data)} bytes, MIME type: {mime_type}")
-
-                # Sla foto op in de database
-                photo_id = auth_backend.save_photo(
-                    user_id=user_id,
-                    original_filename=file.filename,
-                    image_data=image_data,
-                    mime_type=mime_type,
-                    location_opt_in=location_opt_in,
-                )
-
-                print(f"Photo saved with ID: {photo_id}")
-                # Verzamel de response-data per foto
+        # Metadata en opslag parallel, daarna één insert voor alle foto's
+        results = auth_backend.save_photos_batch(user_id, uploads, location_opt_in, duplicate_policy)
+
+        uploaded_photos = []
+        failed_photos = []
+        for upload, result in zip(uploads, results):
+            duplicate_of = str(result["duplicateOf"]) if result.get("duplicateOf") else None
+            if "id" in result:
                 uploaded_photos.append({
-                    "id": str(photo_id),
-                    "originalFilename": file.filename,
+                    "id": str(result["id"]),
+                    "originalFilename": upload["originalFilename"],
+                    "duplicateOf": duplicate_of,
                 })
-            except Exception as e:
-                print(f"Failed to upload {file.filename}: {e}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({
-                    "error": f"Failed to upload {file.filename}",
-                    "details": str(e)
-                }), 500
-
-        print(f"Upload complete: {len(uploaded_photos)} photos uploaded")
+            else:
+                print(f"Failed to upload {upload['originalFilename']}: {result['error']}")
+                failed_photos.append({
+                    "originalFilename": upload["originalFilename"],
+                    "error": result["error"],
+                    "duplicateOf": duplicate_of,
+                })
+
+        print(f"Upload complete: {len(uploaded_photos)} photos uploaded, {len(failed_photos)} failed")
+
+        if failed_photos and not uploaded_photos:
+            # Niets opgeslagen: 400 als alle bestanden geweigerd zijn, anders een serverfout
+            status = 400 if all(result.get("rejected") for result in results) else 500
+            return jsonify({
+                "error": "Failed to upload photos",
+                "details": failed_photos[0]["error"],
+                "photos": [],
+                "failed": failed_photos,
+            }), status
+
         return jsonify({
             "message": f"{len(uploaded_photos)} foto(s) succesvol geupload",
             "photos": uploaded_photos,
+            "failed": failed_photos,
         }), 201
+    except RequestEntityTooLarge:
+        # Te grote upload: afgehandeld door de 413-handler van de app
+        raise
     except Exception as e:
         print(f"Upload endpoint error: {e}")
         import traceback
@@ -84,6 +111,103 @@ def upload_photos():
         }), 500
 
 
+def _parse_hashes(values):
+    # Normaliseer een lijst SHA-256-hashes; None als er een ongeldige tussen zit
+    if not isinstance(values, list) or len(values) > MAX_HASHES_PER_REQUEST:
+        return None
+    hashes = [value.lower() for value in values if isinstance(value, str)]
+    if len(hashes) != len(values) or not all(SHA256_PATTERN.fullmatch(value) for value in hashes):
+        return None
+    return hashes
+
+
+@files_bp.route("/api/photos/check-hashes", methods=["POST"])
+def check_photo_hashes():
+    try:
+        # Haal user-id op uit request en valideer
+        user_id, err = require_user_id(request)
+        if err:
+            return err
+
+        # Lijst SHA-256-hashes van de bestanden die de client wil uploaden
+        body = request.get_json(silent=True) or {}
+        hashes = _parse_hashes(body.get("hashes"))
+        if hashes is None:
+            return jsonify({"error": f"hashes must be a list of at most {MAX_HASHES_PER_REQUEST} SHA-256 hex strings"}), 400
+
+        known = auth_backend.get_known_hashes(user_id, hashes)
+
+        return jsonify({
+            "known": [value for value in hashes if value in known],
+            "unknown": [value for value in hashes if value not in known],
+        }), 200
+    except Exception as e:
+        print(f"Check hashes error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to check hashes",
+            "details": str(e)
+        }), 500
+
+
+@files_bp.route("/api/photos/register", methods=["POST"])
+def register_photos():
+    try:
+        # Haal user-id op uit request en valideer
+        user_id, err = require_user_id(request)
+        if err:
+            return err
+
+        # Foto's die de server al heeft: [{"sha256Hash": ..., "originalFilename": ...}]
+        body = request.get_json(silent=True) or {}
+        entries = body.get("photos")
+        if not isinstance(entries, list) or not entries or not all(isinstance(entry, dict) for entry in entries):
+            return jsonify({"error": "photos must be a non-empty list"}), 400
+
+        hashes = _parse_hashes([entry.get("sha256Hash") for entry in entries])
+        if hashes is None:
+            return jsonify({"error": f"Each photo needs a valid sha256Hash (max {MAX_HASHES_PER_REQUEST} photos)"}), 400
+
+        entries = [
+            {"sha256Hash": value, "originalFilename": entry.get("originalFilename") or f"photo_{value[:12]}"}
+            for value, entry in zip(hashes, entries)
+        ]
+        location_opt_in = bool(body.get("locationOptIn", False))
+
+        results = auth_backend.register_photos_by_hash(user_id, entries, location_opt_in)
+
+        registered_photos = []
+        failed_photos = []
+        for entry, result in zip(entries, results):
+            if "id" in result:
+                registered_photos.append({
+                    "id": str(result["id"]),
+                    "originalFilename": entry["originalFilename"],
+                    "duplicateOf": str(result["duplicateOf"]),
+                })
+            else:
+                failed_photos.append({
+                    "originalFilename": entry["originalFilename"],
+                    "sha256Hash": entry["sha256Hash"],
+                    "error": result["error"],
+                })
+
+        return jsonify({
+            "message": f"{len(registered_photos)} foto(s) geregistreerd",
+            "photos": registered_photos,
+            "failed": failed_photos,
+        }), 201 if registered_photos else 400
+    except Exception as e:
+        print(f"Register photos error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to register photos",
+            "details": str(e)
+        }), 500
+
+
 @files_bp.route("/api/photos", methods=["GET"])
 def get_photos():
     try:
@@ -92,13 +216,21 @@ def get_photos():
         if err:
             return err
 
-        # Haal alle foto's van de gebruiker op
-        photos = auth_backend.get_user_photos(user_id)
+        # Optionele paginatie via ?limit=&after=
+        limit, after, err = get_page_args(request)
+        if err:
+            return err
+
+        # Haal de foto's van de gebruiker op (zonder limit: allemaal)
+        photos, next_cursor = auth_backend.get_user_photos(user_id, limit=limit, after=after)
 
         return jsonify({
             "photos": photos,
             "count": len(photos),
+            "nextCursor": next_cursor,
         }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Get photos error: {e}")
         import traceback
@@ -109,6 +241,19 @@ def get_photos():
         }), 500
 
 
+def _cache_photo_response(response, etag):
+    # ETag en cacheheaders; zonder hash (oude foto's) blijft de standaard no-cache van send_file
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = None
+        response.cache_control.public = None
+        response.cache_control.private = True
+        response.cache_control.max_age = PHOTO_FILE_MAX_AGE
+        response.cache_control.immutable = True
+        response.expires = None
+    return response
+
+
 @files_bp.route("/api/photos/<photo_id>/file", methods=["GET"])
 def get_photo_file(photo_id):
     try:
@@ -117,19 +262,50 @@ def get_photo_file(photo_id):
         if err:
             return err
 
-        # Haal de foto op en controleer toegang
-        photo = auth_backend.get_photo_by_id(photo_id, user_id)
+        # Optioneel een verkleinde versie (?size=128 of ?size=512) in plaats van het origineel
+        size = request.args.get("size", type=int)
+        if "size" in request.args and not (size and auth_backend.is_valid_rendition_size(size)):
+            return jsonify({"error": f"size must be one of {', '.join(str(s) for s in auth_backend.RENDITION_SIZES)}"}), 400
+
+        # Haal enkel de metadata op en controleer toegang; de blob wordt pas geopend als hij echt verstuurd moet worden
+        info = auth_backend.get_photo_file_info(photo_id, user_id)
+        if not info:
+            return jsonify({"error": "Photo not found or access denied"}), 404
 
+        # De inhoud bij een id verandert nooit: de hash (+ formaat) is een sterke ETag
+        # Een gehercodeerd origineel wordt als ander bytepatroon verstuurd en krijgt daarom de codec in zijn ETag
+        etag = None
+        if info["sha256Hash"]:
+            codec = (info["blobRef"] or {}).get("codec")
+            if size:
+                etag = f"{info['sha256Hash']}-{size}"
+            elif codec:
+                etag = f"{info['sha256Hash']}-{codec}"
+            else:
+                etag = info["sha256Hash"]
+            if request.if_none_match.contains_weak(etag):
+                # De browser heeft deze versie al: 304 zonder de afbeelding te laden
+                return _cache_photo_response(Response(status=304), etag)
+
+        photo = auth_backend.open_photo_file(info, size)
         if not photo:
             return jsonify({"error": "Photo not found or access denied"}), 404
 
-        # Stuur de ruwe afbeelding terug
-        return send_file(
-            BytesIO(photo["imageData"]),
+        # Stuur de ruwe afbeelding terug; een pad uit de fs-store gaat via sendfile zonder kopie in Python
+        response = send_file(
+            photo["file"],
             mimetype=photo["mimeType"],
             as_attachment=False,
-            download_name=f"photo_{photo_id}",
+            download_name=f"photo_{photo_id}_{size}.webp" if size else f"photo_{photo_id}",
+            conditional=False,
+            etag=etag or False,
         )
+        if response.content_length is None and photo.get("sizeBytes") is not None:
+            response.content_length = photo["sizeBytes"]
+
+        # Range-requests (206) en If-None-Match/If-Range via werkzeug
+        response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
+        return _cache_photo_response(response, etag)
     except Exception as e:
         print(f"Get photo file error: {e}")
         import traceback
@@ -148,13 +324,14 @@ def delete_all_photos():
         if err:
             return err
 
-        # Verwijder alle foto's van de gebruiker
+        # Markeer alle foto's van de gebruiker als verwijderd; opruimen gebeurt in de achtergrond
         deleted_count = auth_backend.delete_user_photos(user_id)
+        auth_backend.start_photo_purger()
 
         return jsonify({
             "deletedCount": deleted_count,
             "message": f"{deleted_count} foto('s) verwijderd",
-        }), 200
+        }), 202
     except Exception as e:
         print(f"Delete photos error: {e}")
         import traceback
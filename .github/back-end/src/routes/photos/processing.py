@@ -1,11 +1,7 @@
 from flask import Blueprint, request, jsonify
 import auth_backend
-import pytesseract
-from PIL import Image
-import tempfile
-import os
-import time
 from utils.auth import require_user_id
+from utils.pagination import get_page_args
 
 # Blueprint voor verwerkingsroutes
 processing_bp = Blueprint("processing", __name__)
@@ -19,68 +15,35 @@ def process_all_photos():
         if err:
             return err
 
-        # Haal alle foto's op die nog verwerkt moeten worden
+        # Optioneel voorbewerkingsprofiel voor de OCR (anders de standaard van de server)
+        body = request.get_json(silent=True) or {}
+        preprocess_profile = body.get("preprocessProfile") or request.args.get("preprocessProfile")
+        if preprocess_profile and not auth_backend.is_valid_preprocess_profile(preprocess_profile):
+            return jsonify({"error": f"Unknown preprocess profile: {preprocess_profile}"}), 400
+
+        # Taalprofiel: expliciet in de request, anders de voorkeur van de gebruiker
+        language_profile = body.get("ocrLanguage") or request.args.get("ocrLanguage") or auth_backend.get_user_ocr_language(user_id)
+        if language_profile and not auth_backend.is_valid_language_profile(language_profile):
+            return jsonify({"error": f"Unknown OCR language profile: {language_profile}"}), 400
+
+        # Haal de ids (en groottes) op van de foto's die nog verwerkt moeten worden
+        # De workers laden elke afbeelding pas vlak voor de OCR
         photos_to_process = auth_backend.get_photos_for_processing(user_id)
 
         if len(photos_to_process) == 0:
             return jsonify({"error": "Geen foto's om te verwerken"}), 400
 
         photo_ids = [str(photo["_id"]) for photo in photos_to_process]
+        photo_sizes = {str(photo["_id"]): photo.get("metadata", {}).get("fileSizeBytes", 0) for photo in photos_to_process}
 
-        # Zet alle foto's alvast op status "received"
-        for photo_id in photo_ids:
-            auth_backend.update_photo_status(photo_id, "received")
-
-        import threading
-
-        def process_photos_background():
-            for photo in photos_to_process:
-                photo_id = str(photo["_id"])
-
-                try:
-                    # Update status naar "extracting"
-                    auth_backend.update_photo_status(photo_id, "extracting")
-
-                    image_data = photo["imageStorage"]["imageData"]
-
-                    start_time = time.time()
-
-                    # Schrijf de afbeelding tijdelijk naar schijf voor OCR
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-                        temp_file.write(image_data)
-                        temp_path = temp_file.name
+        # Zet foto's die nog niet in verwerking zijn alvast op status "received"
+        auth_backend.mark_photos_received(photo_ids)
 
-                    try:
-                        # Lees de afbeelding en extraheer tekst
-                        img = Image.open(temp_path)
-                        raw_text = pytesseract.image_to_string(img, lang="eng+nld")
-                        extracted_text = " ".join(raw_text.split())
+        # Plan een OCR-job per foto in; foto's die al in de wachtrij staan blijven ongemoeid
+        auth_backend.enqueue_ocr_jobs(user_id, photo_ids, preprocess_profile, language_profile, photo_sizes)
 
-                        # Verzamel metadata over de verwerking
-                        processing_duration = int((time.time() - start_time) * 1000)
-                        text_length = len(extracted_text)
-                        line_count = len(raw_text.split('\n'))
-
-                        processing_meta = {
-                            "textLength": text_length,
-                            "lineCount": line_count,
-                            "processingDurationMs": processing_duration,
-                        }
-
-                        # Update status naar "done" met resultaat en metadata
-                        auth_backend.update_photo_status(photo_id, "done", extracted_text=extracted_text, processing_meta=processing_meta)
-                    finally:
-                        # Ruim het tijdelijke bestand op
-                        os.unlink(temp_path)
-
-                except Exception as e:
-                    error_message = str(e)
-                    # Markeer deze foto als error
-                    auth_backend.update_photo_status(photo_id, "error", error_message=error_message)
-
-        # Start verwerking in een aparte thread
-        thread = threading.Thread(target=process_photos_background)
-        thread.start()
+        # Laat de OCR-worker in dit proces de jobs oppikken (losse workers via src/ocr_worker.py)
+        auth_backend.start_inline_ocr_worker()
 
         return jsonify({
             "message": f"Verwerken van {len(photo_ids)} foto('s) gestart",
@@ -105,13 +68,21 @@ def get_photos_status():
         if err:
             return err
 
-        # Haal de status van alle foto's op
-        photos = auth_backend.get_photos_status(user_id)
+        # Optionele paginatie via ?limit=&after=
+        limit, after, err = get_page_args(request)
+        if err:
+            return err
+
+        # Haal de status van de foto's op (zonder limit: allemaal)
+        photos, next_cursor = auth_backend.get_photos_status(user_id, limit=limit, after=after)
 
         return jsonify({
             "photos": photos,
             "total": len(photos),
+            "nextCursor": next_cursor,
         }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Get photos status error: {e}")
         import traceback
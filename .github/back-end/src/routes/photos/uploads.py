@@ -0,0 +1,198 @@
+from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+import auth_backend
+from utils.auth import require_user_id
+from utils.uploads import UPLOAD_MAX_FILE_BYTES
+from services.upload_sessions import UploadSessionError, UPLOAD_CHUNK_BYTES
+
+# Blueprint voor hervatbare uploads (sessie aanmaken -> chunks -> afronden)
+uploads_bp = Blueprint("uploads", __name__)
+
+
+def _session_json(session):
+    # Publieke weergave van een uploadsessie
+    return {
+        "uploadId": str(session["_id"]),
+        "originalFilename": session["originalFilename"],
+        "status": session["status"],
+        "offset": session["receivedBytes"],
+        "totalBytes": session["totalBytes"],
+        "chunkSize": UPLOAD_CHUNK_BYTES,
+        "expiresAt": session["expiresAt"].isoformat(),
+    }
+
+
+def _session_error(e):
+    # Zet een protocolfout om naar een response, met de huidige offset zodat de client kan hervatten
+    response = {"error": str(e)}
+    if e.session:
+        response["offset"] = e.session["receivedBytes"]
+        response["status"] = e.session["status"]
+    return jsonify(response), e.status
+
+
+def _result_json(session, result):
+    # Zelfde vorm als POST /api/photos, voor één bestand
+    duplicate_of = str(result["duplicateOf"]) if result.get("duplicateOf") else None
+    if "id" in result:
+        return jsonify({
+            "message": "1 foto(s) succesvol geupload",
+            "photos": [{"id": str(result["id"]), "originalFilename": session["originalFilename"], "duplicateOf": duplicate_of}],
+            "failed": [],
+        }), 201
+
+    failed = [{"originalFilename": session["originalFilename"], "error": result["error"], "duplicateOf": duplicate_of}]
+    return jsonify({
+        "error": "Failed to upload photos",
+        "details": result["error"],
+        "photos": [],
+        "failed": failed,
+    }), 400 if result.get("rejected") else 500
+
+
+@uploads_bp.route("/api/photos/uploads", methods=["POST"])
+def create_upload():
+    try:
+        # Haal user-id op uit request en valideer
+        user_id, err = require_user_id(request)
+        if err:
+            return err
+
+        body = request.get_json(silent=True) or {}
+        original_filename = body.get("originalFilename")
+        total_bytes = body.get("totalBytes")
+        if not original_filename or not isinstance(total_bytes, int) or total_bytes <= 0:
+            return jsonify({"error": "originalFilename and a positive totalBytes are required"}), 400
+        if total_bytes > UPLOAD_MAX_FILE_BYTES:
+            return jsonify({"error": f"File exceeds the maximum size of {UPLOAD_MAX_FILE_BYTES} bytes"}), 413
+
+        sha256_hash = body.get("sha256Hash")
+        if sha256_hash is not None and (not isinstance(sha256_hash, str) or len(sha256_hash) != 64):
+            return jsonify({"error": "sha256Hash must be a SHA-256 hex string"}), 400
+
+        duplicate_policy = body.get("duplicatePolicy")
+        if duplicate_policy and not auth_backend.is_valid_duplicate_policy(duplicate_policy):
+            return jsonify({"error": f"Unknown duplicate policy: {duplicate_policy}"}), 400
+
+        session = auth_backend.create_upload_session(
+            user_id,
+            original_filename,
+            body.get("mimeType") or "image/jpeg",
+            total_bytes,
+            sha256_hash=sha256_hash.lower() if sha256_hash else None,
+            location_opt_in=bool(body.get("locationOptIn", False)),
+            duplicate_policy=duplicate_policy,
+        )
+
+        return jsonify(_session_json(session)), 201
+    except Exception as e:
+        print(f"Create upload session error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to create upload session",
+            "details": str(e)
+        }), 500
+
+
+@uploads_bp.route("/api/photos/uploads/<upload_id>", methods=["GET"])
+def get_upload(upload_id):
+    try:
+        # Haal user-id op uit request en valideer
+        user_id, err = require_user_id(request)
+        if err:
+            return err
+
+        # Hervatten: de client vraagt hier de offset op waar hij verder moet gaan
+        session = auth_backend.get_upload_session(upload_id, user_id)
+        if not session:
+            return jsonify({"error": "Upload session not found or expired"}), 404
+
+        return jsonify(_session_json(session)), 200
+    except Exception as e:
+        print(f"Get upload session error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to retrieve upload session",
+            "details": str(e)
+        }), 500
+
+
+@uploads_bp.route("/api/photos/uploads/<upload_id>", methods=["PUT"])
+def put_upload_chunk(upload_id):
+    try:
+        # Haal user-id op uit request en valideer
+        user_id, err = require_user_id(request)
+        if err:
+            return err
+
+        # Offset van deze chunk (query of Upload-Offset header); de body zijn de ruwe bytes
+        offset = request.args.get("offset", request.headers.get("Upload-Offset"))
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            return jsonify({"error": "offset is required"}), 400
+
+        session = auth_backend.write_upload_chunk(upload_id, user_id, offset, request.stream, request.content_length)
+
+        return jsonify(_session_json(session)), 200
+    except UploadSessionError as e:
+        return _session_error(e)
+    except RequestEntityTooLarge:
+        # Te grote chunk: afgehandeld door de 413-handler van de app
+        raise
+    except Exception as e:
+        print(f"Upload chunk error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to store chunk",
+            "details": str(e)
+        }), 500
+
+
+@uploads_bp.route("/api/photos/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    try:
+        # Haal user-id op uit request en valideer
+        user_id, err = require_user_id(request)
+        if err:
+            return err
+
+        # Volledig ontvangen bestand door hetzelfde ingest-pad als POST /api/photos
+        session, result = auth_backend.finalize_upload_session(upload_id, user_id)
+
+        return _result_json(session, result)
+    except UploadSessionError as e:
+        return _session_error(e)
+    except Exception as e:
+        print(f"Finalize upload error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to finalize upload",
+            "details": str(e)
+        }), 500
+
+
+@uploads_bp.route("/api/photos/uploads/<upload_id>", methods=["DELETE"])
+def abort_upload(upload_id):
+    try:
+        # Haal user-id op uit request en valideer
+        user_id, err = require_user_id(request)
+        if err:
+            return err
+
+        if not auth_backend.discard_upload_session(upload_id, user_id):
+            return jsonify({"error": "Upload session not found or busy"}), 404
+
+        return jsonify({"message": "Upload session removed"}), 200
+    except Exception as e:
+        print(f"Abort upload error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": "Failed to remove upload session",
+            "details": str(e)
+        }), 500
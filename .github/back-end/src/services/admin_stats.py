@@ -53,7 +53,11 @@ def get_admin_stats() -> dict:
             stats["ocrSuccessRate"] = 0
 
         ocr_pipeline = [
-            {"$match": {"ocr.status": "done", "ocr.extractedText": {"$exists": True, "$ne": ""}}},
+            # Gearchiveerde foto's hebben geen tekst meer in het stub-document; ocr.meta.textLength wel
+            {"$match": {"ocr.status": "done", "$or": [
+                {"ocr.extractedText": {"$exists": True, "$ne": ""}},
+                {"archivedAt": {"$exists": True}, "ocr.meta.textLength": {"$gt": 0}},
+            ]}},
             {"$group": {
                 "_id": None,
                 "avgTextLength": {"$avg": "$ocr.meta.textLength"},
@@ -1,14 +1,15 @@
 from datetime import datetime
 from bson import ObjectId
 from db import photos, summaries
+from services.photo_archive import merge_archived_fields
 
 
 def get_photos_for_analysis(user_id: str):
     # Haal alle foto's op die klaar zijn voor analyse
-    return list(photos.find({
+    return merge_archived_fields(list(photos.find({
         "userId": ObjectId(user_id),
         "ocr.status": "done",
-    }).sort("uploadedAt", 1))
+    }).sort("uploadedAt", 1)))
 
 
 def get_photos_for_analysis_limited(user_id: str, max_photos: int = 20, max_chars: int = 8000):
@@ -22,16 +23,23 @@ def get_photos_for_analysis_limited(user_id: str, max_photos: int = 20, max_char
     })
     print(f"DEBUG: User has {total_user_photos} total photos, {ocr_done_photos} with OCR done")
 
+    # Bij gearchiveerde foto's staat de tekst in het archief; ocr.meta.textLength zegt of er tekst is
     photos_cursor = photos.find({
         "userId": ObjectId(user_id),
         "ocr.status": "done",
-        "ocr.extractedText": {"$exists": True, "$ne": ""},
+        "$or": [
+            {"ocr.extractedText": {"$exists": True, "$ne": ""}},
+            {"archivedAt": {"$exists": True}, "ocr.meta.textLength": {"$gt": 0}},
+        ],
     }).sort("uploadedAt", -1)
 
     limited_photos = []
     total_chars = 0
 
     for photo in photos_cursor:
+        if photo.get("archivedAt"):
+            merge_archived_fields([photo])
+
         if len(limited_photos) >= max_photos:
             print(f"Reached photo limit of {max_photos}")
             break
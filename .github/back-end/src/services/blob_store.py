@@ -0,0 +1,371 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta
+import gridfs
+import io
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from db import db, blobs
+from services.storage_codec import encode_for_storage, decode_from_storage
+
+# Waar afbeeldingen bewaard worden: "fs" (content-addressed mappen op schijf) of "gridfs" (in MongoDB)
+BLOB_STORE = os.environ.get("BLOB_STORE", "fs")
+# Basismap van de fs-store
+BLOB_STORE_PATH = os.environ.get(
+    "BLOB_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "..", "data", "blobs"),
+)
+
+# Koude laag: blobs van gearchiveerde foto's staan (zo nodig gecomprimeerd) in deze map, buiten de warme store
+BLOB_ARCHIVE_PATH = os.environ.get(
+    "BLOB_ARCHIVE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "..", "data", "archive"),
+)
+
+_gridfs_instance = None
+
+
+def _gridfs():
+    # GridFS pas aanmaken als hij effectief gebruikt wordt
+    global _gridfs_instance
+    if _gridfs_instance is None:
+        _gridfs_instance = gridfs.GridFS(db, collection="blobfs")
+    return _gridfs_instance
+
+
+def _content_name(key: str, codec: str = None) -> str:
+    # Gehercodeerde inhoud krijgt een eigen naam, zodat ze naast het origineel kan bestaan tijdens het omzetten
+    return f"{key}.{codec}" if codec else key
+
+
+def _blob_path(key: str, codec: str = None) -> str:
+    # Verdeel bestanden over submappen (ab/cd/abcd...) zodat geen enkele map te groot wordt
+    return os.path.join(BLOB_STORE_PATH, key[:2], key[2:4], _content_name(key, codec))
+
+
+def _blob_ref(store: str, key: str, codec: str = None) -> dict:
+    # Referentie zoals ze in een foto-document bewaard wordt; codec enkel als de inhoud gehercodeerd is
+    blob_ref = {"store": store, "key": key}
+    if codec:
+        blob_ref["codec"] = codec
+    return blob_ref
+
+
+def _data_size(data) -> int:
+    # Grootte van bytes of van een (seekable) bestand
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    data.seek(0, os.SEEK_END)
+    return data.tell()
+
+
+def _write_fs_blob(key: str, codec: str, data):
+    _write_file_atomic(_blob_path(key, codec), data)
+
+
+def _write_file_atomic(path: str, data):
+    # Schrijf atomisch: eerst naar een tijdelijk bestand in dezelfde map, daarna hernoemen
+    # data zijn bytes of een bestand dat in blokken gekopieerd wordt
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if isinstance(data, (bytes, bytearray)):
+                f.write(data)
+            else:
+                data.seek(0)
+                shutil.copyfileobj(data, f, 1024 * 1024)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def _write_gridfs_blob(name: str, data):
+    # GridFS-bestand met de hash als _id; bestaat het al, dan is er niets te doen
+    if _gridfs().exists(name):
+        return
+    if not isinstance(data, (bytes, bytearray)):
+        data.seek(0)
+    try:
+        _gridfs().put(data, _id=name)
+    except gridfs.errors.FileExists:
+        pass
+
+
+def _blob_content_exists(store: str, key: str, codec: str = None) -> bool:
+    if store == "gridfs":
+        return _gridfs().exists(_content_name(key, codec))
+    return os.path.exists(_blob_path(key, codec))
+
+
+def _write_blob_content(store: str, key: str, codec: str, data):
+    if store == "gridfs":
+        _write_gridfs_blob(_content_name(key, codec), data)
+    else:
+        _write_fs_blob(key, codec, data)
+
+
+def _delete_blob_content(store: str, key: str, codec: str = None):
+    if store == "gridfs":
+        _gridfs().delete(_content_name(key, codec))
+    else:
+        path = _blob_path(key, codec)
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def _stored_content(codec: str, data, encoded: tuple = None):
+    # De bytes die voor een blob met deze codec geschreven moeten worden
+    if not codec:
+        return data
+    if encoded and encoded[0] == codec:
+        return encoded[1]
+    return encode_for_storage(data, codec, force=True)[1]
+
+
+def put_blob(data, key: str = None, encoded: tuple = None) -> dict:
+    # Bewaar de bytes (of een bestand) onder hun SHA-256 en verhoog de referentieteller; identieke inhoud wordt maar één keer opgeslagen
+    # De inhoud wordt pas geschreven nadat de referentie geregistreerd is, zodat opruimen nooit een nieuwe referentie raakt
+    # encoded = (codec, bytes) bewaart een nieuwe blob gehercodeerd; een bestaande blob houdt zijn eigen codec
+    if key is None:
+        if not isinstance(data, (bytes, bytearray)):
+            raise ValueError("put_blob needs a key when storing a stream")
+        key = hashlib.sha256(data).hexdigest()
+
+    for _attempt in range(50):
+        existing = blobs.find_one_and_update(
+            {"_id": key, "state": "live"},
+            {"$inc": {"refCount": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if existing:
+            # Een vorige schrijver kan halverwege gestopt zijn: inhoud zo nodig alsnog schrijven
+            codec = existing.get("codec")
+            if existing.get("tier") == "cold":
+                # Gearchiveerde inhoud wordt opnieuw gebruikt: met de geüploade bytes terug naar de warme laag
+                restore_blob(key, _stored_content(codec, data, encoded))
+            elif not _blob_content_exists(existing["store"], key, codec):
+                _write_blob_content(existing["store"], key, codec, _stored_content(codec, data, encoded))
+            return _blob_ref(existing["store"], key, codec)
+
+        codec, content = encoded if encoded else (None, data)
+        try:
+            blobs.update_one(
+                {"_id": key, "state": "live"},
+                {
+                    "$inc": {"refCount": 1},
+                    "$setOnInsert": {"store": BLOB_STORE, "state": "live", "codec": codec, "sizeBytes": _data_size(content), "createdAt": datetime.utcnow()},
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Deze blob wordt net opgeruimd: even wachten tot dat klaar is en opnieuw proberen
+            time.sleep(0.05)
+            continue
+
+        stored = blobs.find_one({"_id": key}, {"store": 1, "codec": 1})
+        _write_blob_content(stored["store"], key, stored.get("codec"), _stored_content(stored.get("codec"), data, encoded))
+        return _blob_ref(stored["store"], key, stored.get("codec"))
+
+    raise RuntimeError(f"Could not store blob {key}: it stays locked for deletion")
+
+
+def retain_blob(blob_ref: dict):
+    # Extra referentie naar een bestaande blob zonder de inhoud opnieuw te schrijven; None als hij niet (meer) bestaat
+    existing = blobs.find_one_and_update(
+        {"_id": blob_ref["key"], "state": "live"},
+        {"$inc": {"refCount": 1}},
+    )
+    if not existing:
+        return None
+    return _blob_ref(existing["store"], blob_ref["key"], existing.get("codec"))
+
+
+def _open_content(blob_ref: dict):
+    # Pad (fs) of GridFS-stream van de opgeslagen inhoud, zoals ze bewaard is
+    codec = blob_ref.get("codec")
+    if blob_ref["store"] == "gridfs":
+        try:
+            return _gridfs().get(_content_name(blob_ref["key"], codec))
+        except gridfs.errors.NoFile:
+            raise FileNotFoundError(f"Blob {blob_ref['key']} not found") from None
+    path = _blob_path(blob_ref["key"], codec)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Blob {blob_ref['key']} not found")
+    return path
+
+
+def _read_content(blob_ref: dict) -> bytes:
+    content = _open_content(blob_ref)
+    if not isinstance(content, str):
+        return content.read()
+    with open(content, "rb") as f:
+        return f.read()
+
+
+def _load_content(blob_ref: dict):
+    # Lees de opgeslagen inhoud; geeft (bytes, codec) terug
+    # Staat ze niet waar de referentie zegt, dan is de blob net gehercodeerd of naar de koude laag verhuisd
+    try:
+        return _read_content(blob_ref), blob_ref.get("codec")
+    except FileNotFoundError:
+        pass
+
+    current = blobs.find_one({"_id": blob_ref["key"]}, {"store": 1, "codec": 1, "tier": 1, "archiveCompression": 1})
+    if current and current.get("tier") == "cold":
+        return _read_archive(current), current.get("codec")
+    if not current or current.get("codec") == blob_ref.get("codec"):
+        raise FileNotFoundError(f"Blob {blob_ref['key']} not found")
+    return _read_content(_blob_ref(current["store"], blob_ref["key"], current.get("codec"))), current.get("codec")
+
+
+def open_blob(blob_ref: dict):
+    # Geef iets terug dat send_file rechtstreeks kan versturen: een pad (fs, via sendfile) of een GridFS-stream
+    # Gehercodeerde of gearchiveerde blobs worden eerst (terug naar het oorspronkelijke formaat) in het geheugen gelezen
+    if not blob_ref.get("codec"):
+        try:
+            return _open_content(blob_ref)
+        except FileNotFoundError:
+            pass
+    content, codec = _load_content(blob_ref)
+    return io.BytesIO(decode_from_storage(content, codec))
+
+
+def read_blob(blob_ref: dict, decode: bool = True) -> bytes:
+    # Lees de volledige inhoud van een blob (bv. voor OCR)
+    # decode=False geeft de opgeslagen vorm terug (Pillow leest die ook rechtstreeks, met dezelfde pixels)
+    content, codec = _load_content(blob_ref)
+    return decode_from_storage(content, codec) if decode else content
+
+
+def _archive_path(blob: dict) -> str:
+    name = _content_name(blob["_id"], blob.get("codec"))
+    suffix = ".zz" if blob.get("archiveCompression") == "zlib" else ""
+    return os.path.join(BLOB_ARCHIVE_PATH, name[:2], name[2:4], name + suffix)
+
+
+def _read_archive(blob: dict) -> bytes:
+    with open(_archive_path(blob), "rb") as f:
+        data = f.read()
+    return zlib.decompress(data) if blob.get("archiveCompression") == "zlib" else data
+
+
+def archive_blob(key: str) -> bool:
+    # Verhuis de inhoud van een blob naar de koude laag (zlib als dat minstens 10% spaart); het record blijft in blobs
+    current = blobs.find_one({"_id": key, "state": "live", "tier": {"$ne": "cold"}})
+    if not current:
+        return False
+    try:
+        content = _read_content(_blob_ref(current["store"], key, current.get("codec")))
+    except FileNotFoundError:
+        return False
+
+    compressed = zlib.compress(content, 6)
+    archived = dict(current, archiveCompression="zlib" if len(compressed) < len(content) * 0.9 else None)
+    _write_file_atomic(_archive_path(archived), compressed if archived["archiveCompression"] else content)
+
+    result = blobs.update_one(
+        {"_id": key, "state": "live", "tier": {"$ne": "cold"}, "codec": current.get("codec")},
+        {"$set": {"tier": "cold", "archiveCompression": archived["archiveCompression"], "archivedAt": datetime.utcnow()}},
+    )
+    if not result.modified_count:
+        # Intussen verwijderd, hercodeerd of door een ander proces gearchiveerd
+        if not blobs.find_one({"_id": key, "tier": "cold"}, {"_id": 1}) and os.path.exists(_archive_path(archived)):
+            os.unlink(_archive_path(archived))
+        return False
+
+    _delete_blob_content(current["store"], key, current.get("codec"))
+    return True
+
+
+def restore_blob(key: str, content: bytes = None) -> bool:
+    # Zet een gearchiveerde blob terug in de warme store; content zijn de opgeslagen bytes als die al bekend zijn
+    current = blobs.find_one({"_id": key, "state": "live", "tier": "cold"})
+    if not current:
+        return False
+
+    _write_blob_content(current["store"], key, current.get("codec"), _read_archive(current) if content is None else content)
+    result = blobs.update_one(
+        {"_id": key, "tier": "cold"},
+        {"$unset": {"tier": "", "archiveCompression": "", "archivedAt": ""}},
+    )
+    if result.modified_count and os.path.exists(_archive_path(current)):
+        os.unlink(_archive_path(current))
+    return True
+
+
+def set_blob_codec(key: str, codec: str, content: bytes):
+    # Hercodeer een bestaande blob: nieuwe inhoud naast de oude schrijven, de codec omzetten en pas dan het oude bestand weggooien
+    # Geeft de nieuwe referentie terug, of None als de blob intussen verdwenen of al omgezet is
+    current = blobs.find_one({"_id": key, "state": "live", "tier": {"$ne": "cold"}}, {"store": 1, "codec": 1})
+    if not current or current.get("codec") == codec:
+        return None
+
+    _write_blob_content(current["store"], key, codec, content)
+    result = blobs.update_one(
+        {"_id": key, "state": "live", "tier": {"$ne": "cold"}, "codec": current.get("codec")},
+        {"$set": {"codec": codec, "sizeBytes": len(content)}},
+    )
+    if not result.modified_count:
+        # Verwijderd of door een ander proces omgezet: onze kopie opruimen als niemand ze gebruikt
+        if not blobs.find_one({"_id": key, "codec": codec}, {"_id": 1}):
+            _delete_blob_content(current["store"], key, codec)
+        return None
+
+    _delete_blob_content(current["store"], key, current.get("codec"))
+    return _blob_ref(current["store"], key, codec)
+
+
+def release_blob(blob_ref: dict) -> bool:
+    # Verlaag de referentieteller en verwijder de inhoud als niemand de blob nog gebruikt
+    # Geeft True terug als de blob effectief verwijderd is
+    remaining = blobs.find_one_and_update(
+        {"_id": blob_ref["key"], "state": "live", "refCount": {"$gt": 0}},
+        {"$inc": {"refCount": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not remaining or remaining["refCount"] > 0:
+        return False
+    return _delete_unreferenced_blob(blob_ref["key"])
+
+
+def _delete_unreferenced_blob(key: str) -> bool:
+    # Zet de blob eerst op "deleting" (put_blob hergebruikt hem dan niet meer), verwijder de inhoud en daarna het record
+    doomed = blobs.find_one_and_update(
+        {"_id": key, "state": "live", "refCount": {"$lte": 0}},
+        {"$set": {"state": "deleting", "deletingSince": datetime.utcnow()}},
+    )
+    if not doomed:
+        return False
+    _remove_blob_content(doomed)
+    return True
+
+
+def _remove_blob_content(doomed: dict):
+    _delete_blob_content(doomed["store"], doomed["_id"], doomed.get("codec"))
+    if doomed.get("tier") == "cold" and os.path.exists(_archive_path(doomed)):
+        os.unlink(_archive_path(doomed))
+    blobs.delete_one({"_id": doomed["_id"], "state": "deleting"})
+
+
+def collect_unreferenced_blobs(limit: int = 100, stale_seconds: int = 300) -> int:
+    # Garbage collection: blobs zonder referenties die (bv. na een crash) nooit opgeruimd werden,
+    # en verwijderingen die langer dan stale_seconds geleden halverwege gestopt zijn
+    removed = 0
+    for blob in blobs.find({"state": "live", "refCount": {"$lte": 0}}, {"_id": 1}).limit(limit):
+        if _delete_unreferenced_blob(blob["_id"]):
+            removed += 1
+
+    stale_before = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    for blob in blobs.find({"state": "deleting", "deletingSince": {"$lt": stale_before}}).limit(limit):
+        _remove_blob_content(blob)
+        removed += 1
+    return removed
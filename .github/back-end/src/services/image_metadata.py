@@ -0,0 +1,153 @@
+import hashlib
+import io
+import os
+from datetime import datetime
+from PIL import Image, UnidentifiedImageError
+from PIL.ExifTags import TAGS
+
+# Afbeeldingen met meer pixels worden geweigerd (bescherming tegen decompression bombs)
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", "80000000"))
+
+# EXIF-subdirectories: de opnamedatum staat in de Exif-IFD, de coördinaten in de GPS-IFD
+_EXIF_IFD = 0x8769
+_GPS_IFD = 0x8825
+
+
+def _clean_exif_string(value):
+    # Camera's vullen strings vaak op met NUL-bytes
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", errors="replace")
+    return value.strip("\x00 ").strip() if isinstance(value, str) else value
+
+
+def _summarize_exif(exif_data) -> dict:
+    # Zet een Pillow Exif-object om naar de velden die we bewaren
+    if not exif_data:
+        return None
+
+    exif = {}
+    tags = dict(exif_data)
+    try:
+        tags.update(exif_data.get_ifd(_EXIF_IFD))
+    except Exception:
+        pass
+
+    for tag_id, value in tags.items():
+        tag_name = TAGS.get(tag_id, tag_id)
+
+        if tag_name == "DateTimeOriginal":
+            try:
+                exif["dateTimeOriginal"] = datetime.strptime(_clean_exif_string(value), "%Y:%m:%d %H:%M:%S")
+            except Exception:
+                pass
+        elif tag_name == "Make":
+            exif["make"] = _clean_exif_string(value)
+        elif tag_name == "Model":
+            exif["model"] = _clean_exif_string(value)
+        elif tag_name == "Orientation":
+            exif["orientation"] = int(value)
+
+    exif["gpsPresent"] = _GPS_IFD in exif_data
+    return exif
+
+
+def extract_exif(image_data: bytes):
+    # Extraheer basis-EXIF metadata uit de afbeelding (enkel de header, zonder pixels te decoderen)
+    try:
+        with Image.open(io.BytesIO(image_data)) as img:
+            return _summarize_exif(img.getexif())
+    except Exception as e:
+        print(f"Warning: Failed to extract EXIF: {e}")
+        return None
+
+
+def extract_gps_coords(exif_data):
+    # Extraheer GPS-coordinaten uit EXIF data ({"GPSInfo": {tag: waarde}})
+    try:
+        if not exif_data or "GPSInfo" not in exif_data:
+            return None, None
+
+        gps_info = exif_data["GPSInfo"]
+
+        def convert_to_degrees(value):
+            d, m, s = value
+            return float(d) + (float(m) / 60.0) + (float(s) / 3600.0)
+
+        lat = None
+        lon = None
+
+        if 2 in gps_info and 1 in gps_info:
+            lat = convert_to_degrees(gps_info[2])
+            if gps_info[1] == "S":
+                lat = -lat
+
+        if 4 in gps_info and 3 in gps_info:
+            lon = convert_to_degrees(gps_info[4])
+            if gps_info[3] == "W":
+                lon = -lon
+
+        return lat, lon
+    except Exception:
+        return None, None
+
+
+def _file_digest(stream):
+    # SHA-256 en grootte van een bestand, in blokken gelezen
+    sha256 = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        sha256.update(chunk)
+        size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+def extract_image_metadata(image_data, mime_type: str, location_opt_in: bool, filename: str = None, digest: tuple = None):
+    # Eén doorgang over de upload: header parsen (afmetingen, EXIF, GPS) en hashen, zonder pixels te decoderen
+    # image_data zijn bytes of een bestand; digest = (sha256, grootte) als die al tijdens het uploaden berekend is
+    # Geeft (metadata, exif) terug; ValueError voor onleesbare bestanden en afbeeldingen boven IMAGE_MAX_PIXELS
+    stream = io.BytesIO(image_data) if isinstance(image_data, (bytes, bytearray)) else image_data
+    stream.seek(0)
+
+    try:
+        img = Image.open(stream)
+    except UnidentifiedImageError:
+        raise ValueError("File is not a supported image") from None
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as e:
+        # Pillow weigert zelf al vanaf ongeveer 2x MAX_IMAGE_PIXELS (of bij elke overschrijding als de waarschuwing een fout is)
+        raise ValueError(f"Image is too large: {e}") from None
+
+    with img:
+        width, height = img.size
+        if width * height > IMAGE_MAX_PIXELS:
+            raise ValueError(f"Image is too large: {width}x{height} pixels (max {IMAGE_MAX_PIXELS})")
+
+        exif = None
+        try:
+            exif_data = img.getexif()
+            exif = _summarize_exif(exif_data)
+
+            # Bewaar GPS alleen als de gebruiker opt-in is
+            if exif and exif["gpsPresent"] and location_opt_in:
+                lat, lon = extract_gps_coords({"GPSInfo": exif_data.get_ifd(_GPS_IFD)})
+                if lat is not None and lon is not None:
+                    exif["gpsLatitude"] = lat
+                    exif["gpsLongitude"] = lon
+        except Exception as e:
+            print(f"Warning: EXIF extraction failed for {filename}: {e}")
+
+    if digest is None:
+        if isinstance(image_data, (bytes, bytearray)):
+            digest = (hashlib.sha256(image_data).hexdigest(), len(image_data))
+        else:
+            digest = _file_digest(stream)
+    sha256_hash, size = digest
+
+    metadata = {
+        "mimeType": mime_type,
+        "fileSizeBytes": size,
+        "imageWidth": width,
+        "imageHeight": height,
+        "sha256Hash": sha256_hash,
+    }
+    return metadata, exif
@@ -0,0 +1,320 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from db import blobs, photos, migrations
+from services.blob_store import BLOB_STORE, put_blob, read_blob, release_blob
+from services.photos import calculate_sha256, load_photo_image_data
+
+# Aantal foto's per bulk_write en pauze tussen batches, zodat een migratie de database niet monopoliseert
+MIGRATION_BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", "200"))
+MIGRATION_PAUSE_SECONDS = float(os.environ.get("MIGRATION_PAUSE_SECONDS", "0.2"))
+
+# Er draait hooguit één migratie tegelijk (over alle processen); een lease die niet verlengd wordt, vervalt
+_LOCK_ID = "_lock"
+_LOCK_LEASE_SECONDS = 300
+# Aantal voorbeeldwijzigingen in een dry-run
+_DRY_RUN_SAMPLE_SIZE = 3
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def _plan_original_filename(photo: dict, dry_run: bool):
+    # Oude documenten bewaren de bestandsnaam in filename of original_name
+    original_filename = (
+        photo.get("originalFilename") or
+        photo.get("filename") or
+        photo.get("original_name") or
+        f"photo_{photo['_id']}"
+    )
+    return (
+        {"_id": photo["_id"]},
+        {"$set": {"originalFilename": original_filename}, "$unset": {"filename": "", "original_name": ""}},
+    )
+
+
+_EMBEDDED_IMAGE_FILTER = {
+    "imageStorage.blobRef": {"$exists": False},
+    "$or": [{"imageStorage.imageData": {"$exists": True}}, {"imageData": {"$exists": True}}],
+}
+
+
+def _legacy_metadata(photo: dict, sha256_hash: str, file_size_bytes) -> dict:
+    # Oude documenten hebben geen metadata-blok: hash, grootte en MIME-type aanvullen waar ze ontbreken
+    # Zonder hash geen ETag, duplicaatdetectie, hash-precheck of OCR-cache
+    metadata = photo.get("metadata") or {}
+    fields = {}
+    if not metadata.get("sha256Hash"):
+        fields["metadata.sha256Hash"] = sha256_hash
+    if metadata.get("fileSizeBytes") is None and file_size_bytes is not None:
+        fields["metadata.fileSizeBytes"] = file_size_bytes
+    if not metadata.get("mimeType") and photo.get("mimeType"):
+        fields["metadata.mimeType"] = photo["mimeType"]
+    return fields
+
+
+def _plan_embedded_image(photo: dict, dry_run: bool):
+    # Ingebedde afbeeldingen (imageStorage.imageData of top-level imageData) naar de blob store
+    image_data = load_photo_image_data(photo)
+    if image_data is None:
+        return None
+    sha256_hash = calculate_sha256(image_data)
+    blob_ref = {"store": BLOB_STORE, "key": sha256_hash} if dry_run else put_blob(image_data, key=sha256_hash)
+    photo["_plannedBlobRef"] = blob_ref
+    return (
+        {"_id": photo["_id"], "imageStorage.blobRef": {"$exists": False}},
+        {
+            "$set": {"imageStorage.blobRef": blob_ref, **_legacy_metadata(photo, sha256_hash, len(image_data))},
+            "$unset": {"imageStorage.imageData": "", "imageData": "", "mimeType": ""},
+        },
+    )
+
+
+def _release_unapplied_blobs(batch: list):
+    # Foto's die na de bulk_write nog ingebedde data hebben, kregen hun blob niet: die referentie terug vrijgeven
+    planned = {photo["_id"]: photo["_plannedBlobRef"] for photo in batch if "_plannedBlobRef" in photo}
+    if not planned:
+        return
+    for photo in photos.find({"_id": {"$in": list(planned)}, **_EMBEDDED_IMAGE_FILTER}, {"_id": 1}):
+        release_blob(planned[photo["_id"]])
+
+
+def _plan_ocr_text_length(photo: dict, dry_run: bool):
+    # Archief en analyse gebruiken ocr.meta.textLength om te weten of een foto tekst heeft
+    text = (photo.get("ocr") or {}).get("extractedText") or ""
+    return ({"_id": photo["_id"]}, {"$set": {"ocr.meta.textLength": len(text)}})
+
+
+def _plan_blob_metadata(photo: dict, dry_run: bool):
+    # Foto's die onder versie 2 naar de blob store gingen voor die ook de metadata aanvulde: hash = sleutel van de blob
+    blob_ref = photo["imageStorage"]["blobRef"]
+    file_size_bytes = None
+    if not (photo.get("metadata") or {}).get("fileSizeBytes"):
+        blob = blobs.find_one({"_id": blob_ref["key"]}, {"codec": 1, "sizeBytes": 1}) or {}
+        if blob and not blob.get("codec"):
+            file_size_bytes = blob.get("sizeBytes")
+        elif not dry_run:
+            # Gehercodeerd: de grootte van het origineel enkel via de teruggezette bytes
+            try:
+                file_size_bytes = len(read_blob(blob_ref))
+            except FileNotFoundError:
+                pass
+    update = {}
+    fields = _legacy_metadata(photo, blob_ref["key"], file_size_bytes)
+    if fields:
+        update["$set"] = fields
+    if "mimeType" in photo:
+        update["$unset"] = {"mimeType": ""}
+    return ({"_id": photo["_id"]}, update) if update else None
+
+
+# Geordende lijst van migraties; een toegepaste versie wordt nooit gewijzigd, enkel nieuwe achteraan toevoegen
+# filter: documenten die de migratie nog nodig hebben; plan(doc, dry_run): (filter, update) of None
+MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "original-filename",
+        "description": "Copy filename/original_name into originalFilename and drop the legacy fields",
+        "filter": {"$or": [
+            {"originalFilename": {"$exists": False}},
+            {"filename": {"$exists": True}},
+            {"original_name": {"$exists": True}},
+        ]},
+        "projection": {"originalFilename": 1, "filename": 1, "original_name": 1},
+        "plan": _plan_original_filename,
+    },
+    {
+        "version": 2,
+        "name": "embedded-image-blobs",
+        "description": "Move embedded image bytes into the blob store",
+        "filter": _EMBEDDED_IMAGE_FILTER,
+        "projection": {"imageStorage": 1, "imageData": 1, "metadata": 1, "mimeType": 1},
+        "plan": _plan_embedded_image,
+        "after_batch": _release_unapplied_blobs,
+    },
+    {
+        "version": 3,
+        "name": "ocr-text-length",
+        "description": "Backfill ocr.meta.textLength for photos processed before it was recorded",
+        "filter": {
+            "ocr.status": "done",
+            "ocr.meta.textLength": {"$exists": False},
+            "archivedAt": {"$exists": False},
+        },
+        "projection": {"ocr.extractedText": 1},
+        "plan": _plan_ocr_text_length,
+    },
+    {
+        "version": 4,
+        "name": "legacy-blob-metadata",
+        "description": "Backfill metadata.sha256Hash, fileSizeBytes and mimeType for photos moved to the blob store without them",
+        "filter": {
+            "imageStorage.blobRef": {"$exists": True},
+            "$or": [{"metadata.sha256Hash": {"$exists": False}}, {"mimeType": {"$exists": True}}],
+        },
+        "projection": {"imageStorage.blobRef": 1, "metadata": 1, "mimeType": 1},
+        "plan": _plan_blob_metadata,
+    },
+]
+
+
+def _acquire_lock(owner: str) -> bool:
+    # Neem (of verleng) de migratielock; False als een ander proces aan het migreren is
+    now = datetime.utcnow()
+    try:
+        lock = migrations.find_one_and_update(
+            {"_id": _LOCK_ID, "$or": [{"owner": owner}, {"leaseExpiresAt": {"$lt": now}}]},
+            {"$set": {"owner": owner, "leaseExpiresAt": now + timedelta(seconds=_LOCK_LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        return False
+    return lock is not None and lock["owner"] == owner
+
+
+def _release_lock(owner: str):
+    migrations.delete_one({"_id": _LOCK_ID, "owner": owner})
+
+
+def migrations_running() -> bool:
+    # Is er ergens een migratie bezig (met een geldige lease)?
+    return migrations.count_documents({"_id": _LOCK_ID, "leaseExpiresAt": {"$gt": datetime.utcnow()}}) > 0
+
+
+def _run_migration(migration: dict, owner: str, batch_size: int, pause_seconds: float):
+    # Voer één migratie uit vanaf haar checkpoint; na elke batch wordt het checkpoint bewaard
+    state = migrations.find_one({"_id": migration["version"]}) or {}
+    if state.get("status") == "done":
+        return
+
+    now = datetime.utcnow()
+    migrations.update_one(
+        {"_id": migration["version"]},
+        {
+            "$set": {"name": migration["name"], "status": "running", "updatedAt": now, "error": None},
+            "$setOnInsert": {"startedAt": now, "checkpoint": None, "processed": 0, "modified": 0},
+        },
+        upsert=True,
+    )
+
+    checkpoint = state.get("checkpoint")
+    while True:
+        query = dict(migration["filter"])
+        if checkpoint:
+            query = {"$and": [query, {"_id": {"$gt": checkpoint}}]}
+        batch = list(photos.find(query, migration["projection"]).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for photo in batch:
+            planned = migration["plan"](photo, False)
+            if planned:
+                operations.append(UpdateOne(*planned))
+
+        try:
+            modified = photos.bulk_write(operations, ordered=False).modified_count if operations else 0
+        finally:
+            # Ook bij een mislukte bulk_write opruimen wat niet toegepast werd
+            if migration.get("after_batch"):
+                migration["after_batch"](batch)
+
+        checkpoint = batch[-1]["_id"]
+        migrations.update_one(
+            {"_id": migration["version"]},
+            {"$set": {"checkpoint": checkpoint, "updatedAt": datetime.utcnow()}, "$inc": {"processed": len(batch), "modified": modified}},
+        )
+
+        if not _acquire_lock(owner):
+            raise RuntimeError("Migration lock lost to another process")
+        time.sleep(pause_seconds)
+
+    migrations.update_one(
+        {"_id": migration["version"]},
+        {"$set": {"status": "done", "finishedAt": datetime.utcnow(), "updatedAt": datetime.utcnow()}},
+    )
+    print(f"Migration {migration['version']} ({migration['name']}) complete")
+
+
+def run_migrations(batch_size: int = None, pause_seconds: float = None) -> bool:
+    # Voer alle openstaande migraties in volgorde uit; een onderbroken run gaat verder vanaf het laatste checkpoint
+    # False als een ander proces al aan het migreren is
+    batch_size = batch_size or MIGRATION_BATCH_SIZE
+    pause_seconds = MIGRATION_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+    owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    if not _acquire_lock(owner):
+        return False
+
+    try:
+        for migration in MIGRATIONS:
+            try:
+                _run_migration(migration, owner, batch_size, pause_seconds)
+            except Exception as e:
+                # Volgende migraties wachten tot deze lukt; het checkpoint blijft staan
+                migrations.update_one(
+                    {"_id": migration["version"]},
+                    {"$set": {"status": "failed", "error": str(e), "updatedAt": datetime.utcnow()}},
+                )
+                raise
+    finally:
+        _release_lock(owner)
+    return True
+
+
+def get_migration_report(dry_run: bool = False) -> list:
+    # Voortgang per migratie; met dry_run ook een paar voorbeeldwijzigingen, zonder iets te schrijven
+    # Geen count_documents op de (niet geïndexeerde) migratiefilters: dat zou bij elke statusvraag de hele collectie scannen
+    # remaining is dus enkel gekend als de migratie klaar is (0) of bij een dry-run (exacte telling); anders None
+    report = []
+    for migration in MIGRATIONS:
+        state = migrations.find_one({"_id": migration["version"]}) or {}
+        status = state.get("status", "pending")
+        entry = {
+            "version": migration["version"],
+            "name": migration["name"],
+            "description": migration["description"],
+            "status": status,
+            "processed": state.get("processed", 0),
+            "modified": state.get("modified", 0),
+            "remaining": 0 if status == "done" else None,
+            "checkpoint": str(state["checkpoint"]) if state.get("checkpoint") else None,
+            "startedAt": state["startedAt"].isoformat() if state.get("startedAt") else None,
+            "finishedAt": state["finishedAt"].isoformat() if state.get("finishedAt") else None,
+            "error": state.get("error"),
+        }
+
+        if dry_run and entry["status"] != "done":
+            # Een dry-run wordt expliciet gevraagd: dan wel de exacte telling
+            entry["remaining"] = photos.count_documents(migration["filter"])
+            sample = []
+            for photo in photos.find(migration["filter"], migration["projection"]).sort("_id", 1).limit(_DRY_RUN_SAMPLE_SIZE):
+                planned = migration["plan"](photo, True)
+                if planned:
+                    sample.append({"id": str(photo["_id"]), "update": planned[1]})
+            entry["sample"] = sample
+        report.append(entry)
+    return report
+
+
+def _run_migrations_in_background():
+    try:
+        run_migrations()
+    except Exception as e:
+        print(f"Migrations failed: {e}")
+
+
+def start_migrations() -> bool:
+    # Start de openstaande migraties in een achtergrondthread; False als er al een migratie loopt
+    global _runner
+    with _runner_lock:
+        if (_runner is not None and _runner.is_alive()) or migrations_running():
+            return False
+        _runner = threading.Thread(target=_run_migrations_in_background, daemon=True)
+        _runner.start()
+        return True
@@ -0,0 +1,57 @@
+import io
+import time
+from PIL import Image
+from services.ocr_backends import OCR_BACKENDS, get_ocr_backend_name, warm_ocr_engines
+from services.ocr_language import DEFAULT_OCR_LANGUAGE_PROFILE, OCR_FALLBACK_LANG, resolve_ocr_languages
+from services.ocr_preprocess import preprocess_image
+from services.ocr_tiling import ocr_in_strips, set_tile_workers, track_ocr_task
+
+
+def load_image(image_data: bytes):
+    # Decodeer de afbeelding rechtstreeks vanuit het geheugen
+    img = Image.open(io.BytesIO(image_data))
+    img.load()
+    return img
+
+
+def init_ocr_process(languages=(), tile_workers: int = 1, active_tasks=None):
+    # Initializer van een OCR-worker-process: strook-threads begrenzen en de taalmodellen alvast laden
+    set_tile_workers(tile_workers, active_tasks)
+    warm_ocr_engines(languages)
+
+
+def image_to_text(img, lang: str = OCR_FALLBACK_LANG) -> str:
+    # Haal tekst uit een afbeelding via de ingestelde OCR-backend
+    return OCR_BACKENDS[get_ocr_backend_name()](img, lang)
+
+
+def run_ocr(image_data: bytes, preprocess_profile: str = None, language_profile: str = None):
+    # Voer OCR uit op de ruwe afbeeldingsbytes en geef tekst + verwerkingsmetadata terug
+    # Draait in een aparte worker-process, dus fouten worden als RuntimeError teruggegeven
+    # (niet elke exception-klasse van de OCR-backends overleeft pickling)
+    try:
+        start_time = time.time()
+
+        # Lees de afbeelding, pas het voorbewerkingsprofiel toe en extraheer tekst
+        with track_ocr_task():
+            img = load_image(image_data)
+            img, preprocess_info = preprocess_image(img, preprocess_profile)
+            languages = resolve_ocr_languages(img, language_profile, image_to_text)
+            raw_text, tile_count = ocr_in_strips(img, languages, image_to_text)
+        extracted_text = " ".join(raw_text.split())
+
+        # Verzamel metadata over de verwerking
+        processing_meta = {
+            "textLength": len(extracted_text),
+            "lineCount": len(raw_text.split('\n')),
+            "processingDurationMs": int((time.time() - start_time) * 1000),
+            "preprocessing": preprocess_info,
+            "languageProfile": language_profile or DEFAULT_OCR_LANGUAGE_PROFILE,
+            "languages": languages,
+            "tiles": tile_count,
+            "engine": get_ocr_backend_name(),
+        }
+
+        return extracted_text, processing_meta
+    except Exception as e:
+        raise RuntimeError(str(e)) from None
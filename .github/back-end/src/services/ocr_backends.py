@@ -0,0 +1,121 @@
+import io
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+import pytesseract
+from PIL import Image
+
+# tesserocr is optioneel: zonder de library valt alles terug op pytesseract
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Gekozen OCR-backend: "auto" (tesserocr indien beschikbaar), "tesserocr" of "pytesseract"
+OCR_BACKEND = os.environ.get("OCR_BACKEND", "auto")
+
+# Maximale duur van één tesseract-aanroep (pytesseract-backend)
+OCR_TIMEOUT_SECONDS = int(os.environ.get("OCR_TIMEOUT_SECONDS", "120"))
+
+# Aantal warme engines (één per taalcombinatie) dat elke thread bijhoudt
+OCR_MAX_WARM_ENGINES = int(os.environ.get("OCR_MAX_WARM_ENGINES", "3"))
+
+# Eén OpenMP-thread per tesseract: de parallelliteit komt al van de pool en de stroken
+_ENGINE_ENV = dict(os.environ, OMP_THREAD_LIMIT=os.environ.get("OMP_THREAD_LIMIT", "1"))
+
+_engines = threading.local()
+
+
+def _flatten_for_engine(img):
+    # Breng de afbeelding naar een modus die Leptonica direct leest (1, L of RGB)
+    if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+        # Transparante delen op een witte achtergrond leggen in plaats van zwart
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    if img.mode not in ("1", "L", "RGB"):
+        return img.convert("RGB")
+    return img
+
+
+def pytesseract_image_to_text(img, lang: str) -> str:
+    # Eén tesseract-proces per afbeelding; de afbeelding gaat als ongecomprimeerde PNM via stdin
+    # en de tekst komt via stdout terug, zonder tijdelijke bestanden
+    buffer = io.BytesIO()
+    _flatten_for_engine(img).save(buffer, format="PPM")
+
+    result = subprocess.run(
+        [pytesseract.pytesseract.tesseract_cmd, "stdin", "stdout", "-l", lang],
+        input=buffer.getvalue(),
+        capture_output=True,
+        timeout=OCR_TIMEOUT_SECONDS,
+        env=_ENGINE_ENV,
+    )
+    if result.returncode != 0:
+        raise pytesseract.TesseractError(result.returncode, result.stderr.decode("utf-8", errors="replace").strip())
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def _get_warm_engine(lang: str):
+    # Geef de engine van deze thread voor deze talen terug; het taalmodel wordt maar één keer geladen
+    # Engines zijn niet thread-safe, dus elke thread krijgt zijn eigen set
+    engines = getattr(_engines, "by_lang", None)
+    if engines is None:
+        engines = _engines.by_lang = OrderedDict()
+
+    engine = engines.get(lang)
+    if engine is not None:
+        engines.move_to_end(lang)
+        return engine
+
+    engine = tesserocr.PyTessBaseAPI(lang=lang)
+    engines[lang] = engine
+
+    # Minst recent gebruikte engine opruimen zodat het geheugen begrensd blijft
+    if len(engines) > OCR_MAX_WARM_ENGINES:
+        _old_lang, old_engine = engines.popitem(last=False)
+        old_engine.End()
+
+    return engine
+
+
+def tesserocr_image_to_text(img, lang: str) -> str:
+    # Herbruik een warme in-process engine: geen procesopstart en geen herladen van traineddata
+    try:
+        engine = _get_warm_engine(lang)
+    except RuntimeError as e:
+        # Engine kon niet starten (bv. ontbrekende traineddata): deze keer via pytesseract
+        print(f"Warning: tesserocr engine for {lang} unavailable, falling back to pytesseract: {e}")
+        return pytesseract_image_to_text(img, lang)
+
+    try:
+        engine.SetImage(_flatten_for_engine(img))
+        return engine.GetUTF8Text()
+    finally:
+        engine.Clear()
+
+
+OCR_BACKENDS = {
+    "tesserocr": tesserocr_image_to_text,
+    "pytesseract": pytesseract_image_to_text,
+}
+
+
+def get_ocr_backend_name() -> str:
+    # Bepaal welke backend effectief gebruikt wordt
+    if OCR_BACKEND == "pytesseract" or tesserocr is None:
+        return "pytesseract"
+    return "tesserocr"
+
+
+def warm_ocr_engines(languages=()):
+    # Laad de taalmodellen alvast bij het starten van een worker-process (initializer van de pool)
+    if get_ocr_backend_name() != "tesserocr":
+        return
+    for lang in languages:
+        try:
+            _get_warm_engine(lang)
+        except RuntimeError as e:
+            print(f"Warning: could not warm tesserocr engine for {lang}: {e}")
@@ -0,0 +1,43 @@
+from datetime import datetime
+from db import ocr_cache
+from services.ocr_backends import get_ocr_backend_name
+from services.ocr_language import DEFAULT_OCR_LANGUAGE_PROFILE
+from services.ocr_preprocess import DEFAULT_OCR_PREPROCESS_PROFILE, OCR_PREPROCESS_PROFILES
+from services.ocr_tiling import get_ocr_tiling_signature
+
+
+def build_ocr_cache_key(sha256_hash: str, preprocess_profile: str = None, language_profile: str = None) -> str:
+    # Cache-sleutel: inhoud (hash) + taalprofiel + voorbewerkingsprofiel en -versie + OCR-engine + stroken-instellingen
+    # Bij "auto" is de gedetecteerde taal een vaste functie van de afbeelding, dus volstaat de profielnaam
+    profile_name = preprocess_profile or DEFAULT_OCR_PREPROCESS_PROFILE
+    version = OCR_PREPROCESS_PROFILES[profile_name]["version"]
+    language_profile = language_profile or DEFAULT_OCR_LANGUAGE_PROFILE
+    return f"{sha256_hash}:{language_profile}:{profile_name}:v{version}:{get_ocr_backend_name()}:{get_ocr_tiling_signature()}"
+
+
+def get_cached_ocr(cache_key: str):
+    # Zoek een eerder OCR-resultaat voor exact dezelfde afbeelding en instellingen
+    return ocr_cache.find_one_and_update(
+        {"_id": cache_key},
+        {"$inc": {"hitCount": 1}, "$set": {"lastHitAt": datetime.utcnow()}},
+    )
+
+
+def store_cached_ocr(cache_key: str, sha256_hash: str, extracted_text: str, processing_meta: dict):
+    # Bewaar een OCR-resultaat zodat identieke afbeeldingen (ook van andere gebruikers) de engine overslaan
+    now = datetime.utcnow()
+    ocr_cache.update_one(
+        {"_id": cache_key},
+        {
+            "$set": {
+                "sha256Hash": sha256_hash,
+                "extractedText": extracted_text,
+                "meta": processing_meta,
+                "updatedAt": now,
+                # Ook nooit gebruikte items verlopen via de TTL-index op lastHitAt
+                "lastHitAt": now,
+            },
+            "$setOnInsert": {"createdAt": now, "hitCount": 0},
+        },
+        upsert=True,
+    )
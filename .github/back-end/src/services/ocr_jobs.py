@@ -0,0 +1,109 @@
+import os
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from db import ocr_jobs
+
+# Hoe lang een geclaimde job van een worker blijft voor hij opnieuw geclaimd mag worden
+OCR_JOB_LEASE_SECONDS = int(os.environ.get("OCR_JOB_LEASE_SECONDS", "120"))
+# Hoe vaak een job geclaimd mag worden voor de foto op error gaat
+OCR_JOB_MAX_ATTEMPTS = int(os.environ.get("OCR_JOB_MAX_ATTEMPTS", "3"))
+
+
+def enqueue_ocr_jobs(user_id: str, photo_ids: list, preprocess_profile: str = None, language_profile: str = None, photo_sizes: dict = None):
+    # Maak per foto een OCR-job aan; foto's met een bestaande job blijven ongemoeid
+    # photo_sizes (photo_id -> bytes) bepaalt de volgorde binnen de batch: grootste eerst
+    # Geeft de ids terug van de foto's die effectief nieuw in de wachtrij staan
+    if not photo_ids:
+        return []
+    photo_sizes = photo_sizes or {}
+
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"photoId": ObjectId(photo_id)},
+            {"$setOnInsert": {
+                "photoId": ObjectId(photo_id),
+                "userId": ObjectId(user_id),
+                "status": "queued",
+                "preprocessProfile": preprocess_profile,
+                "languageProfile": language_profile,
+                "sizeBytes": photo_sizes.get(photo_id, 0),
+                "attempts": 0,
+                "createdAt": now,
+                "leaseOwner": None,
+                "leaseExpiresAt": None,
+                "heartbeatAt": None,
+                "lastError": None,
+            }},
+            upsert=True,
+        )
+        for photo_id in photo_ids
+    ]
+
+    result = ocr_jobs.bulk_write(operations, ordered=False)
+    return [photo_ids[index] for index in result.upserted_ids]
+
+
+def claim_ocr_job(worker_id: str):
+    # Claim atomisch de oudste wachtende job, of een lopende job waarvan de lease verlopen is
+    # Binnen één batch eerst de grootste afbeeldingen, zodat er geen lange job als laatste overblijft
+    now = datetime.utcnow()
+    return ocr_jobs.find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "leaseExpiresAt": {"$lt": now}},
+        ]},
+        {
+            "$set": {
+                "status": "running",
+                "leaseOwner": worker_id,
+                "leaseExpiresAt": now + timedelta(seconds=OCR_JOB_LEASE_SECONDS),
+                "heartbeatAt": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("createdAt", 1), ("sizeBytes", -1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def heartbeat_ocr_jobs(job_ids: list, worker_id: str) -> int:
+    # Verleng de lease van jobs die deze worker nog aan het verwerken is
+    if not job_ids:
+        return 0
+
+    now = datetime.utcnow()
+    result = ocr_jobs.update_many(
+        {"_id": {"$in": job_ids}, "status": "running", "leaseOwner": worker_id},
+        {"$set": {
+            "leaseExpiresAt": now + timedelta(seconds=OCR_JOB_LEASE_SECONDS),
+            "heartbeatAt": now,
+        }},
+    )
+    return result.matched_count
+
+
+def holds_ocr_job_lease(job_id, worker_id: str) -> bool:
+    # Controleer of deze worker de job nog bezit (en verleng meteen de lease)
+    return heartbeat_ocr_jobs([job_id], worker_id) > 0
+
+
+def complete_ocr_job(job_id, worker_id: str) -> bool:
+    # Verwijder een afgewerkte job uit de wachtrij
+    result = ocr_jobs.delete_one({"_id": job_id, "leaseOwner": worker_id})
+    return result.deleted_count > 0
+
+
+def release_ocr_job(job_id, worker_id: str, error_message: str) -> bool:
+    # Zet een mislukte job terug in de wachtrij zodat een andere poging hem kan oppikken
+    result = ocr_jobs.update_one(
+        {"_id": job_id, "leaseOwner": worker_id},
+        {"$set": {
+            "status": "queued",
+            "leaseOwner": None,
+            "leaseExpiresAt": None,
+            "lastError": error_message,
+        }},
+    )
+    return result.modified_count > 0
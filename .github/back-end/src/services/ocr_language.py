@@ -0,0 +1,102 @@
+import os
+import re
+from PIL import Image
+
+# Taalprofielen voor OCR: profielnaam -> Tesseract-talen ("auto" = per afbeelding detecteren)
+OCR_LANGUAGE_PROFILES = {
+    "auto": None,
+    "eng": "eng",
+    "nld": "nld",
+    "fra": "fra",
+    "eng+nld": "eng+nld",
+    "eng+fra": "eng+fra",
+    "nld+fra": "nld+fra",
+    "all": "eng+nld+fra",
+}
+
+DEFAULT_OCR_LANGUAGE_PROFILE = os.environ.get("OCR_LANGUAGE_PROFILE", "auto")
+
+# Talen als de detectie niets bruikbaars vindt (bv. weinig tekst)
+OCR_FALLBACK_LANG = "eng+nld"
+
+# Breedte van het verkleinde staal voor de detectie en het model dat daarvoor gebruikt wordt
+_DETECT_SAMPLE_WIDTH = 600
+_DETECT_SAMPLE_MAX_HEIGHT = 1400
+_DETECT_LANG = "eng"
+
+# Frequente woorden per taal; woorden die ook in een van de andere talen frequent zijn (bv. "is", "en", "de", "je", "was")
+# staan er bewust niet in, zodat een tekst in één taal niet ook de andere selecteert
+_STOPWORDS = {
+    "eng": {
+        "the", "and", "you", "to", "it", "that", "for", "are", "with", "this", "have",
+        "what", "not", "your", "my", "but", "just", "can", "do", "i'm",
+        "don't", "will", "from", "they", "there", "would", "about", "how", "when", "if",
+    },
+    "nld": {
+        "het", "een", "ik", "niet", "dat", "van", "op", "met", "voor",
+        "zijn", "maar", "wat", "ook", "er", "nog", "naar", "wel", "hij", "ze", "kan", "dit",
+        "om", "bij", "jij", "mij", "heb", "wij", "hoe", "wanneer", "morgen", "vandaag",
+    },
+    "fra": {
+        "le", "la", "les", "et", "tu", "est", "une", "des", "du", "que", "qui",
+        "pour", "dans", "ce", "il", "elle", "vous", "nous", "avec", "sur", "mais", "au",
+        "ça", "c'est", "mon", "ma", "oui", "suis", "j'ai", "demain", "aujourd'hui", "merci",
+    },
+}
+
+_WORD_PATTERN = re.compile(r"[a-zà-ÿ']+")
+
+
+def is_valid_language_profile(profile_name: str) -> bool:
+    # Controleer of een taalprofiel bestaat
+    return profile_name in OCR_LANGUAGE_PROFILES
+
+
+def _detection_sample(img):
+    # Maak een klein grijswaarden-staal van de bovenkant van de afbeelding voor de detectie
+    sample = img if img.mode in ("1", "L") else img.convert("L")
+    if sample.width > _DETECT_SAMPLE_WIDTH:
+        factor = _DETECT_SAMPLE_WIDTH / sample.width
+        sample = sample.resize((_DETECT_SAMPLE_WIDTH, max(1, round(sample.height * factor))), Image.BILINEAR)
+    if sample.height > _DETECT_SAMPLE_MAX_HEIGHT:
+        sample = sample.crop((0, 0, sample.width, _DETECT_SAMPLE_MAX_HEIGHT))
+    return sample
+
+
+def score_languages(text: str) -> dict:
+    # Tel per taal hoeveel woorden uit de tekst frequente woorden van die taal zijn
+    scores = {lang: 0 for lang in _STOPWORDS}
+    for word in _WORD_PATTERN.findall(text.lower()):
+        for lang, stopwords in _STOPWORDS.items():
+            if word in stopwords:
+                scores[lang] += 1
+    return scores
+
+
+def detect_ocr_languages(img, image_to_text) -> str:
+    # Snelle detectie: OCR met één model op een verkleind staal, daarna woorden per taal tellen
+    # Geeft enkel de talen terug die duidelijk aanwezig zijn, de sterkste eerst
+    sample_text = image_to_text(_detection_sample(img), lang=_DETECT_LANG)
+    scores = score_languages(sample_text)
+
+    best_score = max(scores.values())
+    if best_score < 2:
+        return OCR_FALLBACK_LANG
+
+    detected = [
+        lang for lang, score in sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if score >= 2 and score >= best_score * 0.25
+    ]
+    return "+".join(detected)
+
+
+def resolve_ocr_languages(img, language_profile: str, image_to_text) -> str:
+    # Bepaal de Tesseract-talen voor één afbeelding op basis van het gekozen profiel
+    language_profile = language_profile or DEFAULT_OCR_LANGUAGE_PROFILE
+    if not is_valid_language_profile(language_profile):
+        raise ValueError(f"Unknown OCR language profile: {language_profile}")
+
+    languages = OCR_LANGUAGE_PROFILES[language_profile]
+    if languages is None:
+        languages = detect_ocr_languages(img, image_to_text)
+    return languages
@@ -0,0 +1,312 @@
+import math
+import multiprocessing
+import os
+import threading
+import socket
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from services.ocr import init_ocr_process, run_ocr
+from services.ocr_language import OCR_FALLBACK_LANG
+from services.ocr_tiling import OCR_TILE_WORKERS
+from services.ocr_jobs import (
+    OCR_JOB_LEASE_SECONDS,
+    OCR_JOB_MAX_ATTEMPTS,
+    claim_ocr_job,
+    heartbeat_ocr_jobs,
+    holds_ocr_job_lease,
+    complete_ocr_job,
+    release_ocr_job,
+)
+from services.ocr_cache import build_ocr_cache_key, get_cached_ocr, store_cached_ocr
+from services.photos import get_photo_for_ocr, load_photo_image_data, update_photo_status
+
+
+def _read_cgroup_cpu_quota():
+    # Lees de CPU-quota van de container (cgroup v2, daarna v1); None als er geen limiet is
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def detect_cpu_quota() -> int:
+    # Bepaal hoeveel cores deze container effectief mag gebruiken
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+
+    quota = _read_cgroup_cpu_quota()
+    if quota:
+        cpus = min(cpus, math.ceil(quota))
+
+    return max(1, cpus)
+
+
+# Grootte van de process pool en globale limiet op gelijktijdige OCR-taken (alle gebruikers samen)
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", "0")) or detect_cpu_quota()
+OCR_MAX_CONCURRENCY = int(os.environ.get("OCR_MAX_CONCURRENCY", "0")) or OCR_WORKERS
+# Strook-threads per poolproces: vast ingesteld, of automatisch tot de CPU-quota naargelang hoe druk de pool is
+OCR_POOL_TILE_WORKERS = OCR_TILE_WORKERS or detect_cpu_quota()
+
+_executor = None
+_executor_lock = threading.Lock()
+_ocr_slots = threading.BoundedSemaphore(OCR_MAX_CONCURRENCY)
+
+# Taalmodellen die elke worker-process bij het opstarten al laadt
+OCR_WARM_LANGUAGES = tuple(lang for lang in os.environ.get("OCR_WARM_LANGUAGES", f"eng,{OCR_FALLBACK_LANG}").split(",") if lang)
+
+# Hoe de pool-processen starten: het webproces heeft al threads (en een MongoClient), dus niet forken
+OCR_POOL_START_METHOD = os.environ.get(
+    "OCR_POOL_START_METHOD",
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn",
+)
+
+# Hoe vaak een idle worker de wachtrij opnieuw bekijkt
+OCR_WORKER_POLL_SECONDS = float(os.environ.get("OCR_WORKER_POLL_SECONDS", "5"))
+
+# Zet op "false" als OCR enkel door aparte worker-processen (src/ocr_worker.py) gedaan wordt
+OCR_INLINE_WORKER = os.environ.get("OCR_INLINE_WORKER", "true").lower() == "true"
+
+_wake_event = threading.Event()
+_inline_worker = None
+_inline_worker_lock = threading.Lock()
+
+
+def get_ocr_executor():
+    # Maak de gedeelde process pool lazy aan
+    # De workers doen enkel OCR en raken de MongoClient nooit aan; ze starten via forkserver/spawn, niet als fork van het webproces
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            mp_context = multiprocessing.get_context(OCR_POOL_START_METHOD)
+            # Teller van lopende taken per pool: een kapotte pool neemt zijn (mogelijk scheve) teller mee
+            active_tasks = None if OCR_TILE_WORKERS else mp_context.Value("i", 0)
+            _executor = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                mp_context=mp_context,
+                initializer=init_ocr_process,
+                initargs=(OCR_WARM_LANGUAGES, OCR_POOL_TILE_WORKERS, active_tasks),
+            )
+        return _executor
+
+
+def _reset_ocr_executor():
+    # Gooi een kapotte pool weg zodat de volgende taak een nieuwe start
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _submit_with_slot(image_data: bytes, preprocess_profile: str = None, language_profile: str = None):
+    # Plan één OCR-taak in met een al verkregen plaats; die komt vrij zodra de taak klaar is
+    # Lukt het inplannen niet, dan geeft de aanroeper de plaats zelf terug
+    try:
+        future = get_ocr_executor().submit(run_ocr, image_data, preprocess_profile, language_profile)
+    except BrokenProcessPool:
+        _reset_ocr_executor()
+        future = get_ocr_executor().submit(run_ocr, image_data, preprocess_profile, language_profile)
+
+    future.add_done_callback(lambda _f: _ocr_slots.release())
+    return future
+
+
+def submit_ocr(image_data: bytes, preprocess_profile: str = None, language_profile: str = None):
+    # Wacht op een vrije plaats binnen de globale limiet en plan één OCR-taak in
+    _ocr_slots.acquire()
+    try:
+        return _submit_with_slot(image_data, preprocess_profile, language_profile)
+    except Exception:
+        _ocr_slots.release()
+        raise
+
+
+def _new_worker_id() -> str:
+    # Unieke naam voor deze worker, zichtbaar als leaseOwner in de jobs-collectie
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _finish_job(job, future, worker_id: str):
+    # Schrijf het resultaat van één afgeronde OCR-taak weg en haal de job uit de wachtrij
+    photo_id = str(job["photoId"])
+
+    try:
+        extracted_text, processing_meta = future.result()
+    except BrokenProcessPool as e:
+        # De worker-process is gecrasht: geef de job terug voor een nieuwe poging
+        _reset_ocr_executor()
+        release_ocr_job(job["_id"], worker_id, f"OCR worker crashed: {e}")
+        return
+    except Exception as e:
+        if holds_ocr_job_lease(job["_id"], worker_id):
+            update_photo_status(photo_id, "error", error_message=str(e))
+            complete_ocr_job(job["_id"], worker_id)
+        return
+
+    # Een worker die zijn lease kwijt is laat het resultaat aan de nieuwe eigenaar over
+    if not holds_ocr_job_lease(job["_id"], worker_id):
+        print(f"OCR worker {worker_id}: lease lost for job {job['_id']}, dropping result")
+        return
+
+    update_photo_status(photo_id, "done", extracted_text=extracted_text, processing_meta=processing_meta)
+    complete_ocr_job(job["_id"], worker_id)
+
+    if job.get("cacheKey"):
+        try:
+            store_cached_ocr(job["cacheKey"], job["sha256Hash"], extracted_text, processing_meta)
+        except Exception as e:
+            print(f"OCR worker {worker_id}: failed to store OCR cache entry: {e}")
+
+
+def _start_job(job, worker_id: str):
+    # Laad de foto van een geclaimde job en plan de OCR in; None als er niets te doen valt
+    # De worker heeft vooraf al een plaats genomen: plannen blokkeert nooit terwijl de job geclaimd is
+    photo_id = str(job["photoId"])
+
+    if job["attempts"] > OCR_JOB_MAX_ATTEMPTS:
+        update_photo_status(photo_id, "error", error_message=job.get("lastError") or "OCR job failed too many times")
+        complete_ocr_job(job["_id"], worker_id)
+        return None
+
+    photo = get_photo_for_ocr(photo_id)
+    if not photo:
+        # Foto is intussen verwijderd
+        complete_ocr_job(job["_id"], worker_id)
+        return None
+
+    # Dezelfde afbeelding met dezelfde instellingen al eens herkend? Dan de engine overslaan
+    sha256_hash = photo.get("metadata", {}).get("sha256Hash")
+    if sha256_hash:
+        job["sha256Hash"] = sha256_hash
+        job["cacheKey"] = build_ocr_cache_key(sha256_hash, job.get("preprocessProfile"), job.get("languageProfile"))
+        cached = get_cached_ocr(job["cacheKey"])
+        if cached:
+            processing_meta = dict(cached.get("meta") or {}, cacheHit=True)
+            update_photo_status(photo_id, "done", extracted_text=cached.get("extractedText", ""), processing_meta=processing_meta)
+            complete_ocr_job(job["_id"], worker_id)
+            return None
+
+    try:
+        # Gehercodeerde originelen niet eerst terug omzetten: de OCR leest ze via Pillow met dezelfde pixels
+        future = _submit_with_slot(load_photo_image_data(photo, decode=False), job.get("preprocessProfile"), job.get("languageProfile"))
+    except Exception as e:
+        update_photo_status(photo_id, "error", error_message=str(e))
+        complete_ocr_job(job["_id"], worker_id)
+        return None
+
+    # Update status naar "extracting" zodra de taak een plaats heeft
+    update_photo_status(photo_id, "extracting")
+    return future
+
+
+def run_ocr_worker(worker_id: str = None, stop_event=None):
+    # Verwerk OCR-jobs uit de wachtrij tot stop_event gezet wordt
+    # Er worden nooit meer jobs geclaimd dan de pool tegelijk kan verwerken
+    worker_id = worker_id or _new_worker_id()
+    stop_event = stop_event or threading.Event()
+    in_flight = {}
+    in_flight_lock = threading.Lock()
+    finished_event = threading.Event()
+
+    def heartbeat_loop():
+        # Houd de leases van lopende jobs levend zolang de worker draait
+        while not finished_event.wait(OCR_JOB_LEASE_SECONDS / 3):
+            with in_flight_lock:
+                job_ids = [job["_id"] for job in in_flight.values()]
+            try:
+                heartbeat_ocr_jobs(job_ids, worker_id)
+            except Exception as e:
+                print(f"OCR worker {worker_id}: heartbeat failed: {e}")
+
+    heartbeat_thread = threading.Thread(target=heartbeat_loop, daemon=True)
+    heartbeat_thread.start()
+    print(f"OCR worker {worker_id} started with capacity {OCR_MAX_CONCURRENCY}")
+
+    while not stop_event.is_set() or in_flight:
+        # Meld afgeronde taken terug zodra ze klaar zijn, ongeacht de volgorde: een trage foto houdt de rest niet op
+        for future in [future for future in in_flight if future.done()]:
+            with in_flight_lock:
+                job = in_flight.pop(future)
+            try:
+                _finish_job(job, future, worker_id)
+            except Exception as e:
+                print(f"OCR worker {worker_id}: failed to finish job {job['_id']}: {e}")
+
+        # Vul vrije plaatsen met nieuwe jobs (niet meer tijdens het afsluiten)
+        # Eerst een plaats nemen (zonder wachten), dan pas claimen: zijn alle plaatsen bezet (bv. door /api/extract),
+        # dan blijven de jobs in de wachtrij in plaats van geclaimd te wachten zonder dat hun lease verlengd wordt
+        queue_empty = False
+        slots_full = False
+        while not stop_event.is_set() and len(in_flight) < OCR_MAX_CONCURRENCY:
+            if not _ocr_slots.acquire(blocking=False):
+                slots_full = True
+                break
+            future = None
+            try:
+                job = claim_ocr_job(worker_id)
+                if not job:
+                    queue_empty = True
+                    break
+                future = _start_job(job, worker_id)
+            except Exception as e:
+                print(f"OCR worker {worker_id}: failed to start job: {e}")
+                break
+            finally:
+                if future is None:
+                    # Geen taak ingepland (lege wachtrij, cache-hit of fout): de plaats terug vrijgeven
+                    _ocr_slots.release()
+            if future is not None:
+                with in_flight_lock:
+                    in_flight[future] = job
+
+        if in_flight:
+            # Wakker worden zodra eender welke taak klaar is, zodat haar plaats meteen opnieuw gevuld wordt
+            wait(list(in_flight), timeout=1, return_when=FIRST_COMPLETED)
+        elif slots_full:
+            # Alle plaatsen bezet door andere OCR-taken: kort wachten en opnieuw proberen
+            stop_event.wait(1)
+        elif queue_empty or stop_event.is_set():
+            # Niets te doen: wacht op een nieuwe batch of het volgende poll-interval
+            _wake_event.wait(OCR_WORKER_POLL_SECONDS)
+            _wake_event.clear()
+        else:
+            # Claimen mislukte (bv. database onbereikbaar): even wachten voor een nieuwe poging
+            stop_event.wait(OCR_WORKER_POLL_SECONDS)
+
+    finished_event.set()
+    print(f"OCR worker {worker_id} stopped")
+
+
+def wake_ocr_workers():
+    # Laat de worker in dit proces meteen naar nieuwe jobs kijken
+    _wake_event.set()
+
+
+def start_inline_ocr_worker():
+    # Start (eenmalig) een OCR-worker als achtergrondthread in het webproces
+    global _inline_worker
+    if not OCR_INLINE_WORKER:
+        return
+    with _inline_worker_lock:
+        if _inline_worker is None or not _inline_worker.is_alive():
+            _inline_worker = threading.Thread(target=run_ocr_worker, daemon=True)
+            _inline_worker.start()
+    wake_ocr_workers()
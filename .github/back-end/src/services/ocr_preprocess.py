@@ -0,0 +1,155 @@
+import os
+from PIL import Image, ImageOps
+
+# Voorbewerkingsprofielen voor OCR
+# Verhoog "version" bij elke wijziging aan een profiel: de versie komt mee in ocr.meta
+OCR_PREPROCESS_PROFILES = {
+    # Geen voorbewerking, de afbeelding gaat ongewijzigd naar de engine
+    "none": {
+        "version": 1,
+    },
+    # Telefoon-screenshots: grote, scherpe tekst, dus flink verkleinen kan zonder kwaliteitsverlies
+    "screenshot": {
+        "version": 1,
+        "grayscale": True,
+        "maxWidth": 1000,
+        "binarize": True,
+        "trimBorders": True,
+    },
+    # Foto's en scans: DPI uit de header gebruiken om naar ~300 DPI te schalen
+    "scan": {
+        "version": 1,
+        "grayscale": True,
+        "targetDpi": 300,
+        "maxWidth": 2500,
+        "binarize": True,
+        "trimBorders": False,
+    },
+    # Enkel grijswaarden en verkleinen, geen drempel (voor afbeeldingen met veel kleurverloop)
+    "grayscale": {
+        "version": 1,
+        "grayscale": True,
+        "maxWidth": 1600,
+        "binarize": False,
+        "trimBorders": False,
+    },
+}
+
+DEFAULT_OCR_PREPROCESS_PROFILE = os.environ.get("OCR_PREPROCESS_PROFILE", "screenshot")
+
+# Witte rand rond getrimde afbeeldingen: Tesseract herkent tekst tegen de rand slecht
+_TRIM_PADDING = 10
+
+
+def is_valid_preprocess_profile(profile_name: str) -> bool:
+    # Controleer of een profielnaam bestaat
+    return profile_name in OCR_PREPROCESS_PROFILES
+
+
+def _rescale_factor(img, profile: dict) -> float:
+    # Bepaal de schaalfactor: eerst naar de doel-DPI (als de header er een heeft), daarna begrensd op maxWidth
+    factor = 1.0
+
+    dpi = img.info.get("dpi")
+    target_dpi = profile.get("targetDpi")
+    if target_dpi and dpi and dpi[0] and float(dpi[0]) > 1:
+        factor = min(target_dpi / float(dpi[0]), 2.0)
+
+    max_width = profile.get("maxWidth")
+    if max_width and img.width * factor > max_width:
+        factor = max_width / img.width
+
+    return factor
+
+
+def _otsu_threshold(img) -> int:
+    # Otsu-drempel op het grijswaardenhistogram: maximaliseert de variantie tussen voor- en achtergrond
+    histogram = img.histogram()
+    total = sum(histogram)
+    sum_all = sum(value * count for value, count in enumerate(histogram))
+
+    sum_background = 0
+    weight_background = 0
+    best_variance = 0
+    threshold = 127
+
+    for value in range(256):
+        weight_background += histogram[value]
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+
+        sum_background += value * histogram[value]
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            threshold = value
+
+    return threshold
+
+
+def _trim_borders(img):
+    # Snij lege randen weg (bij zwarte tekst op wit) en laat een kleine witte marge staan
+    bbox = ImageOps.invert(img).getbbox()
+    if not bbox:
+        return img
+
+    left, top, right, bottom = bbox
+    cropped = img.crop((
+        max(0, left - _TRIM_PADDING),
+        max(0, top - _TRIM_PADDING),
+        min(img.width, right + _TRIM_PADDING),
+        min(img.height, bottom + _TRIM_PADDING),
+    ))
+    return cropped
+
+
+def preprocess_image(img, profile_name: str = None):
+    # Pas het gekozen profiel toe en geef de bewerkte afbeelding + info voor ocr.meta terug
+    profile_name = profile_name or DEFAULT_OCR_PREPROCESS_PROFILE
+    if not is_valid_preprocess_profile(profile_name):
+        raise ValueError(f"Unknown OCR preprocess profile: {profile_name}")
+    profile = OCR_PREPROCESS_PROFILES[profile_name]
+
+    original_size = img.size
+
+    if profile.get("grayscale"):
+        if img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info):
+            # Transparantie eerst op wit leggen, anders wordt die zwart
+            rgba = img.convert("RGBA")
+            background = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(background, rgba)
+        img = img.convert("L")
+
+    factor = _rescale_factor(img, profile)
+    if abs(factor - 1.0) > 0.01:
+        new_size = (max(1, round(img.width * factor)), max(1, round(img.height * factor)))
+        img = img.resize(new_size, Image.LANCZOS, reducing_gap=3.0 if factor < 1 else None)
+
+    if profile.get("binarize") and img.mode == "L":
+        # Donkere modus: eerst inverteren zodat de tekst donker op een lichte achtergrond staat
+        histogram = img.histogram()
+        mean = sum(value * count for value, count in enumerate(histogram)) / max(1, sum(histogram))
+        if mean < 128:
+            img = ImageOps.invert(img)
+
+        threshold = _otsu_threshold(img)
+        img = img.point([0] * (threshold + 1) + [255] * (255 - threshold))
+
+        if profile.get("trimBorders"):
+            img = _trim_borders(img)
+
+    preprocess_info = {
+        "profile": profile_name,
+        "version": profile["version"],
+        "originalWidth": original_size[0],
+        "originalHeight": original_size[1],
+        "width": img.width,
+        "height": img.height,
+    }
+    return img, preprocess_info
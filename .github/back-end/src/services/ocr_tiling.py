@@ -0,0 +1,169 @@
+import os
+import re
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageChops
+
+# Vanaf deze hoogte (na voorbewerking) wordt een afbeelding in horizontale stroken geknipt
+OCR_TILE_MIN_HEIGHT = int(os.environ.get("OCR_TILE_MIN_HEIGHT", "4000"))
+# Richthoogte van één strook en overlap tussen opeenvolgende stroken
+OCR_TILE_HEIGHT = int(os.environ.get("OCR_TILE_HEIGHT", "1800"))
+OCR_TILE_OVERLAP = int(os.environ.get("OCR_TILE_OVERLAP", "150"))
+# Aantal stroken van één afbeelding dat tegelijk door tesseract gaat
+# 0 = automatisch: in de OCR-pool zoveel als er cores vrij zijn naast de andere lopende OCR-taken (minstens 1),
+# zodat een hoge screenshot een rustige pool benut zonder een volle pool te overboeken; daarbuiten 1
+OCR_TILE_WORKERS = int(os.environ.get("OCR_TILE_WORKERS", "0"))
+
+# Verhogen bij elke wijziging aan het knippen of samenvoegen die de tekst kan veranderen (ongeldig maakt de OCR-cache)
+OCR_TILING_VERSION = 1
+
+# Maximaal aantal regels dat twee stroken kunnen delen
+_MAX_OVERLAP_LINES = 12
+
+# Vaste threads per proces, zodat warme OCR-engines per thread hergebruikt worden
+_tile_executor = None
+_tile_executor_lock = threading.Lock()
+_tile_workers = OCR_TILE_WORKERS or 1
+# Gedeelde teller (multiprocessing.Value) van de OCR-taken die nu in de pool lopen; None = vast aantal threads
+_active_tasks = None
+
+
+def get_ocr_tiling_signature() -> str:
+    # Versie en instellingen van het knippen in stroken, voor de OCR-cachesleutel
+    return f"t{OCR_TILING_VERSION}.{OCR_TILE_MIN_HEIGHT}.{OCR_TILE_HEIGHT}.{OCR_TILE_OVERLAP}"
+
+
+def _quiet_row(gray, center: int, window: int) -> int:
+    # Zoek rond center de rij met het minste horizontale contrast (geen tekst), zodat er nooit door een regel geknipt wordt
+    top = max(0, center - window)
+    bottom = min(gray.height, center + window)
+    if bottom <= top:
+        return max(0, min(center, gray.height))
+
+    band = gray.crop((0, top, gray.width, bottom))
+    edges = ImageChops.difference(band, ImageChops.offset(band, 1, 0)).convert("F")
+    row_energy = list(edges.resize((1, band.height), Image.BOX).getdata())
+
+    # Energie over een paar rijen optellen: voorkeur voor het midden van een witruimte, niet voor een gat in een letter
+    smoothed = [sum(row_energy[max(0, i - 2):i + 3]) for i in range(len(row_energy))]
+    best = min(range(len(smoothed)), key=lambda i: (smoothed[i], abs(top + i - center)))
+    return top + best
+
+
+def plan_strips(img) -> list:
+    # Verdeel de afbeelding in overlappende stroken (top, bottom) met snijlijnen in lege rijen
+    if img.height < OCR_TILE_MIN_HEIGHT:
+        return [(0, img.height)]
+
+    gray = img if img.mode == "L" else img.convert("L")
+    window = max(1, OCR_TILE_OVERLAP // 2)
+
+    strips = []
+    start = 0
+    while img.height - start > OCR_TILE_HEIGHT * 1.25:
+        end = _quiet_row(gray, start + OCR_TILE_HEIGHT, window)
+        strips.append((start, end))
+
+        # De volgende strook begint een overlap terug, ook weer op een lege rij
+        next_start = _quiet_row(gray, end - OCR_TILE_OVERLAP, window)
+        start = min(max(next_start, start + 1), end)
+
+    strips.append((start, img.height))
+    return strips
+
+
+def _normalize_line(line: str) -> str:
+    return re.sub(r"\s+", " ", line).strip().lower()
+
+
+def merge_strip_texts(texts: list) -> str:
+    # Plak de tekst van de stroken aan elkaar en laat regels uit de overlap maar één keer staan
+    merged = []
+
+    for text in texts:
+        lines = [line for line in text.splitlines() if line.strip()]
+        if merged and lines:
+            previous_tail = [_normalize_line(line) for line in merged[-_MAX_OVERLAP_LINES:]]
+            current_head = [_normalize_line(line) for line in lines[:_MAX_OVERLAP_LINES]]
+
+            # Langste reeks regels waarmee de vorige strook eindigt en de nieuwe begint
+            # Beide snijlijnen liggen in lege rijen, dus de overlap bevat volledige regels met identieke OCR
+            overlap = 0
+            for size in range(min(len(previous_tail), len(current_head)), 0, -1):
+                if previous_tail[-size:] == current_head[:size]:
+                    overlap = size
+                    break
+            lines = lines[overlap:]
+
+        merged.extend(lines)
+
+    return "\n".join(merged)
+
+
+def set_tile_workers(workers: int, active_tasks=None):
+    # Stel het (maximale) aantal strook-threads van dit proces in (door de initializer van de OCR-pool, voor de eerste OCR)
+    # Met active_tasks hangt het aantal dat een afbeelding echt gebruikt af van hoe druk de pool is
+    global _tile_workers, _active_tasks
+    with _tile_executor_lock:
+        _tile_workers = max(1, workers)
+        _active_tasks = active_tasks
+
+
+@contextmanager
+def track_ocr_task():
+    # Tel een lopende OCR-taak mee in de gedeelde teller van de pool
+    if _active_tasks is None:
+        yield
+        return
+    with _active_tasks.get_lock():
+        _active_tasks.value += 1
+    try:
+        yield
+    finally:
+        with _active_tasks.get_lock():
+            _active_tasks.value -= 1
+
+
+def _strip_parallelism() -> int:
+    # Aantal stroken dat nu tegelijk mag: deze taak plus de cores die de andere lopende taken niet bezetten
+    if _active_tasks is None:
+        return _tile_workers
+    return max(1, _tile_workers - _active_tasks.value + 1)
+
+
+def _get_tile_executor():
+    # Maak de thread pool voor stroken lazy aan (één per proces)
+    global _tile_executor
+    with _tile_executor_lock:
+        if _tile_executor is None:
+            _tile_executor = ThreadPoolExecutor(max_workers=_tile_workers)
+        return _tile_executor
+
+
+def ocr_in_strips(img, lang: str, image_to_text):
+    # OCR een (hoge) afbeelding strook per strook in parallel en geef de samengevoegde tekst + aantal stroken terug
+    strips = plan_strips(img)
+    if len(strips) == 1:
+        return image_to_text(img, lang=lang), 1
+
+    crops = [img.crop((0, top, img.width, bottom)) for top, bottom in strips]
+    # Eén afbeelding per proces tegelijk: de vaste threads wachten op een plek als de pool druk is
+    # De drukte wordt bij elke strook opnieuw bekeken, zodat een lange afbeelding inkrimpt als er taken bijkomen
+    running = [0]
+    slot_free = threading.Condition()
+
+    def ocr_crop(crop):
+        with slot_free:
+            slot_free.wait_for(lambda: running[0] < _strip_parallelism())
+            running[0] += 1
+        try:
+            return image_to_text(crop, lang=lang)
+        finally:
+            with slot_free:
+                running[0] -= 1
+                slot_free.notify_all()
+
+    texts = list(_get_tile_executor().map(ocr_crop, crops))
+
+    return merge_strip_texts(texts), len(strips)
@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from db import photos, photos_archive
+from services.blob_store import archive_blob, restore_blob
+
+# Foto's ouder dan dit aantal dagen (met afgeronde OCR en analyse) gaan naar de archieflaag; 0 schakelt archiveren uit
+PHOTO_ARCHIVE_AFTER_DAYS = int(os.environ.get("PHOTO_ARCHIVE_AFTER_DAYS", "180"))
+# Hoe vaak de archiver kijkt, hoeveel foto's per batch en de pauze tussen batches
+PHOTO_ARCHIVE_INTERVAL_SECONDS = int(os.environ.get("PHOTO_ARCHIVE_INTERVAL_SECONDS", "3600"))
+PHOTO_ARCHIVE_BATCH_SIZE = int(os.environ.get("PHOTO_ARCHIVE_BATCH_SIZE", "100"))
+PHOTO_ARCHIVE_PAUSE_SECONDS = float(os.environ.get("PHOTO_ARCHIVE_PAUSE_SECONDS", "0.5"))
+
+# Zware velden die naar de archiefcollectie verhuizen; status, tijdstippen, ocr.meta, exif en metadata
+# blijven in het stub-document zodat lijsten en admin-statistieken er niets van merken
+ARCHIVED_FIELDS = (
+    "ocr.extractedText",
+    "pipelines.userExtract.resultJson",
+    "pipelines.adminAnalytics.resultJson",
+)
+
+# Enkel foto's waarvan de analyse niet meer verandert
+_SETTLED_ANALYSIS_STATUSES = ("completed", "fallback_used", "llm_failed", "error")
+
+_archiver = None
+_archiver_lock = threading.Lock()
+_archiver_wake = threading.Event()
+
+
+def _get_field(document: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(document, dict) or part not in document:
+            return None
+        document = document[part]
+    return document
+
+
+def _set_field(document: dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+
+def archive_photo(photo: dict) -> bool:
+    # Verplaats de zware velden van één foto naar photos_archive en laat een stub achter
+    # photo bevat minstens _id, ocr.processedAt, imageStorage.blobRef en de ARCHIVED_FIELDS
+    cold = {"_id": photo["_id"], "archivedAt": datetime.utcnow()}
+    moved_paths = [path for path in ARCHIVED_FIELDS if _get_field(photo, path) is not None]
+    for path in moved_paths:
+        _set_field(cold, path, _get_field(photo, path))
+    photos_archive.replace_one({"_id": photo["_id"]}, cold, upsert=True)
+
+    # Enkel als de foto intussen niet opnieuw verwerkt werd
+    update = {"$set": {"archivedAt": cold["archivedAt"]}}
+    if moved_paths:
+        update["$unset"] = {path: "" for path in moved_paths}
+    result = photos.update_one(
+        {
+            "_id": photo["_id"],
+            "archivedAt": {"$exists": False},
+            "ocr.processedAt": _get_field(photo, "ocr.processedAt"),
+        },
+        update,
+    )
+    if not result.modified_count:
+        photos_archive.delete_one({"_id": photo["_id"], "archivedAt": cold["archivedAt"]})
+        return False
+
+    # De blob gaat enkel mee naar het archief als geen enkele niet-gearchiveerde foto hem nog gebruikt
+    blob_ref = _get_field(photo, "imageStorage.blobRef")
+    if blob_ref and not photos.find_one(
+        {"imageStorage.blobRef.key": blob_ref["key"], "archivedAt": {"$exists": False}},
+        {"_id": 1},
+    ):
+        archive_blob(blob_ref["key"])
+    return True
+
+
+def archive_old_photos(older_than_days: int = None, batch_size: int = None, pause_seconds: float = None) -> int:
+    # Archiveer alle foto's die oud genoeg zijn en waarvan OCR en analyse afgerond zijn; geeft het aantal terug
+    older_than_days = PHOTO_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or PHOTO_ARCHIVE_BATCH_SIZE
+    pause_seconds = PHOTO_ARCHIVE_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+    if older_than_days <= 0:
+        return 0
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    candidate_filter = {
+        "uploadedAt": {"$lt": cutoff},
+        "archivedAt": {"$exists": False},
+        "deletedAt": {"$exists": False},
+        "ocr.status": "done",
+        "ocr.processedAt": {"$lt": cutoff},
+        "pipelines.userExtract.status": {"$in": list(_SETTLED_ANALYSIS_STATUSES)},
+    }
+    projection = {"ocr.processedAt": 1, "imageStorage.blobRef": 1, **{path: 1 for path in ARCHIVED_FIELDS}}
+
+    archived_count = 0
+    last_id = None
+    while True:
+        # Op _id verder lopen: een foto die niet gearchiveerd kon worden komt zo niet telkens terug
+        query = dict(candidate_filter, **({"_id": {"$gt": last_id}} if last_id else {}))
+        batch = list(photos.find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        for photo in batch:
+            try:
+                if archive_photo(photo):
+                    archived_count += 1
+            except Exception as e:
+                print(f"Archiving photo {photo['_id']} failed: {e}")
+        last_id = batch[-1]["_id"]
+        time.sleep(pause_seconds)
+
+    if archived_count:
+        print(f"Archive: moved {archived_count} photos older than {older_than_days} days to the archive tier")
+    return archived_count
+
+
+def restore_archived_photo(photo_id) -> bool:
+    # Haal een gearchiveerde foto terug naar de warme laag (velden en blob); False als ze niet gearchiveerd was
+    photo_id = ObjectId(photo_id)
+    photo = photos.find_one({"_id": photo_id, "archivedAt": {"$exists": True}}, {"imageStorage.blobRef": 1, **{path: 1 for path in ARCHIVED_FIELDS}})
+    if not photo:
+        return False
+
+    blob_ref = _get_field(photo, "imageStorage.blobRef")
+    if blob_ref:
+        restore_blob(blob_ref["key"])
+
+    # Velden die intussen opnieuw berekend zijn (bv. een nieuwe analyse) niet overschrijven
+    cold = photos_archive.find_one({"_id": photo_id}) or {}
+    restored_fields = {
+        path: _get_field(cold, path)
+        for path in ARCHIVED_FIELDS
+        if _get_field(cold, path) is not None and _get_field(photo, path) is None
+    }
+    update = {"$unset": {"archivedAt": ""}}
+    if restored_fields:
+        update["$set"] = restored_fields
+    result = photos.update_one({"_id": photo_id, "archivedAt": {"$exists": True}}, update)
+    photos_archive.delete_one({"_id": photo_id})
+    return result.modified_count > 0
+
+
+def merge_archived_fields(documents: list, paths: tuple = ARCHIVED_FIELDS) -> list:
+    # Vul de gearchiveerde velden aan in documenten die als stub opgehaald zijn, zonder ze terug te zetten
+    # Eén query voor alle gearchiveerde documenten in de lijst; paths beperkt welke velden aangevuld worden
+    archived_ids = [document["_id"] for document in documents if document.get("archivedAt")]
+    if not archived_ids:
+        return documents
+
+    cold_documents = {cold["_id"]: cold for cold in photos_archive.find({"_id": {"$in": archived_ids}})}
+    for document in documents:
+        cold = cold_documents.get(document["_id"], {})
+        for path in paths:
+            value = _get_field(cold, path)
+            if value is not None and _get_field(document, path) is None:
+                _set_field(document, path, value)
+    return documents
+
+
+def run_photo_archiver(stop_event=None):
+    # Archiveer periodiek in de achtergrond tot stop_event gezet wordt
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            archive_old_photos()
+        except Exception as e:
+            print(f"Photo archiver failed: {e}")
+        _archiver_wake.wait(PHOTO_ARCHIVE_INTERVAL_SECONDS)
+        _archiver_wake.clear()
+
+
+def start_photo_archiver():
+    # Start (eenmalig) de archiver als achtergrondthread, of laat een draaiende archiver meteen opnieuw kijken
+    global _archiver
+    if PHOTO_ARCHIVE_AFTER_DAYS <= 0:
+        return False
+    with _archiver_lock:
+        if _archiver is None or not _archiver.is_alive():
+            _archiver = threading.Thread(target=run_photo_archiver, daemon=True)
+            _archiver.start()
+        else:
+            _archiver_wake.set()
+    return True
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from db import photos, photos_archive, summaries, ocr_jobs, ocr_cache
+from services.blob_store import release_blob, collect_unreferenced_blobs
+from services.upload_sessions import purge_expired_upload_parts
+
+# Aantal verwijderde foto's per batch en pauze tussen batches, zodat MongoDB geen schrijfpiek krijgt
+PHOTO_PURGE_BATCH_SIZE = int(os.environ.get("PHOTO_PURGE_BATCH_SIZE", "100"))
+PHOTO_PURGE_PAUSE_SECONDS = float(os.environ.get("PHOTO_PURGE_PAUSE_SECONDS", "0.5"))
+# Hoe vaak de purger ook zonder nieuwe verwijderingen kijkt (wezen-blobs, deelbestanden van verlopen uploadsessies)
+PHOTO_PURGE_INTERVAL_SECONDS = int(os.environ.get("PHOTO_PURGE_INTERVAL_SECONDS", "600"))
+
+_purger = None
+_purger_lock = threading.Lock()
+_purger_wake = threading.Event()
+
+
+def purge_deleted_photos_batch(batch_size: int = None) -> int:
+    # Ruim één batch als verwijderd gemarkeerde foto's definitief op; geeft het aantal opgeruimde foto's terug
+    batch_size = batch_size or PHOTO_PURGE_BATCH_SIZE
+    batch = list(photos.find({"deletedAt": {"$exists": True}}, {"_id": 1}).limit(batch_size))
+    if not batch:
+        return 0
+
+    purged_ids = []
+    for photo in batch:
+        # find_one_and_delete: als meerdere processen opruimen, geeft er maar één de blob vrij
+        deleted = photos.find_one_and_delete(
+            {"_id": photo["_id"], "deletedAt": {"$exists": True}},
+            projection={"imageStorage.blobRef": 1},
+        )
+        if not deleted:
+            continue
+        purged_ids.append(deleted["_id"])
+
+        blob_ref = deleted.get("imageStorage", {}).get("blobRef")
+        if blob_ref and release_blob(blob_ref):
+            # Niemand gebruikt deze afbeelding nog: ook de gecachete OCR-tekst verdwijnt
+            ocr_cache.delete_many({"sha256Hash": blob_ref["key"]})
+
+    if purged_ids:
+        # Samenvattingen verwijzen niet langer naar verdwenen foto's; wachtende OCR-jobs vervallen
+        summaries.update_many(
+            {"sourcePhotoIds": {"$in": purged_ids}},
+            {"$pull": {"sourcePhotoIds": {"$in": purged_ids}}},
+        )
+        ocr_jobs.delete_many({"photoId": {"$in": purged_ids}})
+        photos_archive.delete_many({"_id": {"$in": purged_ids}})
+
+    return len(purged_ids)
+
+
+def run_photo_purger(stop_event=None):
+    # Ruim periodiek op tot stop_event gezet wordt; start_photo_purger laat een wachtende purger meteen opnieuw kijken
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            total = 0
+            while True:
+                purged = purge_deleted_photos_batch()
+                if not purged:
+                    break
+                total += purged
+                time.sleep(PHOTO_PURGE_PAUSE_SECONDS)
+
+            collected = collect_unreferenced_blobs()
+            # De TTL-index ruimt verlopen uploadsessies op, hun deelbestanden blijven anders op schijf staan
+            parts = purge_expired_upload_parts(force=True)
+            if total or collected or parts:
+                print(f"Photo purge: removed {total} photos, collected {collected} orphaned blobs, {parts} expired upload parts")
+        except Exception as e:
+            print(f"Photo purge failed: {e}")
+
+        _purger_wake.wait(PHOTO_PURGE_INTERVAL_SECONDS)
+        _purger_wake.clear()
+
+
+def start_photo_purger():
+    # Start (eenmalig) het opruimen als achtergrondthread, of laat een draaiende purger meteen opnieuw kijken
+    global _purger
+    with _purger_lock:
+        if _purger is None or not _purger.is_alive():
+            _purger = threading.Thread(target=run_photo_purger, daemon=True)
+            _purger.start()
+        else:
+            _purger_wake.set()
@@ -1,77 +1,36 @@
+import base64
 import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from bson import ObjectId
-from PIL import Image
-from PIL.ExifTags import TAGS
+from pymongo.errors import BulkWriteError
 import io
 from db import photos
+from services.blob_store import put_blob, retain_blob, open_blob, read_blob, release_blob, set_blob_codec
+from services.image_metadata import extract_image_metadata
+from services.renditions import get_rendition, open_decoded_original
+from services.photo_archive import merge_archived_fields, restore_archived_photo
+from services.storage_codec import STORAGE_CODEC, encode_for_storage
 
+# Aantal uploads van één request dat tegelijk ingelezen en in de blob store gezet wordt
+UPLOAD_INGEST_WORKERS = int(os.environ.get("UPLOAD_INGEST_WORKERS", str(min(8, os.cpu_count() or 1))))
 
-def extract_exif(image_data: bytes):
-    # Extraheer basis-EXIF metadata uit de afbeelding
-    try:
-        img = Image.open(io.BytesIO(image_data))
-        exif_data = img._getexif()
-
-        if not exif_data:
-            return None
-
-        exif = {}
-        gps_present = False
-
-        for tag_id, value in exif_data.items():
-            tag_name = TAGS.get(tag_id, tag_id)
-
-            if tag_name == "DateTimeOriginal":
-                try:
-                    exif["dateTimeOriginal"] = datetime.strptime(value, "%Y:%m:%d %H:%M:%S")
-                except Exception:
-                    pass
-            elif tag_name == "Make":
-                exif["make"] = value
-            elif tag_name == "Model":
-                exif["model"] = value
-            elif tag_name == "Orientation":
-                exif["orientation"] = value
-            elif tag_name == "GPSInfo":
-                gps_present = True
-
-        exif["gpsPresent"] = gps_present
-
-        return exif if exif else None
-    except Exception as e:
-        print(f"Warning: Failed to extract EXIF: {e}")
-        return None
-
-
-def extract_gps_coords(exif_data):
-    # Extraheer GPS-coordinaten uit EXIF data
-    try:
-        if not exif_data or "GPSInfo" not in exif_data:
-            return None, None
-
-        gps_info = exif_data["GPSInfo"]
+# Wat er gebeurt als een gebruiker een afbeelding opnieuw uploadt:
+# "link" (resultaten van de eerdere foto hergebruiken), "reject" (weigeren) of "allow" (gewoon opnieuw verwerken)
+DUPLICATE_POLICIES = ("link", "reject", "allow")
+DEFAULT_DUPLICATE_POLICY = os.environ.get("UPLOAD_DUPLICATE_POLICY", "link")
 
-        def convert_to_degrees(value):
-            d, m, s = value
-            return d + (m / 60.0) + (s / 3600.0)
+# Analyse-statussen waarvan het resultaat bij een duplicaat overgenomen wordt
+_FINISHED_PIPELINE_STATUSES = ("completed", "fallback_used")
 
-        lat = None
-        lon = None
+_ingest_executor = None
+_ingest_executor_lock = threading.Lock()
 
-        if 2 in gps_info and 1 in gps_info:
-            lat = convert_to_degrees(gps_info[2])
-            if gps_info[1] == "S":
-                lat = -lat
-
-        if 4 in gps_info and 3 in gps_info:
-            lon = convert_to_degrees(gps_info[4])
-            if gps_info[3] == "W":
-                lon = -lon
-
-        return lat, lon
-    except Exception:
-        return None, None
+_recompression_thread = None
+_recompression_lock = threading.Lock()
 
 
 def calculate_sha256(image_data: bytes) -> str:
@@ -79,78 +38,125 @@ def calculate_sha256(image_data: bytes) -> str:
     return hashlib.sha256(image_data).hexdigest()
 
 
-def save_photo(user_id: str, original_filename: str, image_data: bytes, mime_type: str, location_opt_in: bool):
-    # Sla een foto met metadata, EXIF en OCR-status op
-    try:
-        img = Image.open(io.BytesIO(image_data))
-
-        sha256_hash = calculate_sha256(image_data)
-
-        metadata = {
-            "mimeType": mime_type,
-            "fileSizeBytes": len(image_data),
-            "imageWidth": img.width,
-            "imageHeight": img.height,
-            "sha256Hash": sha256_hash,
-        }
-
-        exif = None
-        try:
-            exif = extract_exif(image_data)
-        except Exception as e:
-            print(f"Warning: EXIF extraction failed for {original_filename}: {e}")
-
-        # Bewaar GPS alleen als de gebruiker opt-in is
-        if exif and exif.get("gpsPresent") and not location_opt_in:
-            exif["gpsPresent"] = True
-        elif exif and exif.get("gpsPresent") and location_opt_in:
-            try:
-                exif_full = extract_exif(image_data)
-                if exif_full and "GPSInfo" in exif_full:
-                    lat, lon = extract_gps_coords(exif_full)
-                    if lat is not None and lon is not None:
-                        exif["gpsLatitude"] = lat
-                        exif["gpsLongitude"] = lon
-            except Exception as e:
-                print(f"Warning: GPS extraction failed for {original_filename}: {e}")
-
-        photo = {
-            "userId": ObjectId(user_id),
-            "originalFilename": original_filename,
-            "uploadedAt": datetime.utcnow(),
-            "imageStorage": {
-                "imageData": image_data,
+class DuplicatePhotoError(ValueError):
+    # De gebruiker heeft deze afbeelding al (policy "reject")
+    def __init__(self, photo_id):
+        super().__init__(f"Duplicate of photo {photo_id}")
+        self.photo_id = photo_id
+
+
+def is_valid_duplicate_policy(policy: str) -> bool:
+    # Controleer of een duplicate-policy bestaat
+    return policy in DUPLICATE_POLICIES
+
+
+def find_duplicate_photo(user_id: str, sha256_hash: str):
+    # Zoek een eerdere foto van deze gebruiker met dezelfde inhoud, bij voorkeur een die al verwerkt is
+    existing = photos.find_one(
+        {"userId": ObjectId(user_id), "metadata.sha256Hash": sha256_hash},
+        {"ocr": 1, "pipelines": 1, "archivedAt": 1},
+        sort=[("ocr.processedAt", -1)],
+    )
+    # Van een gearchiveerde foto de tekst en analyseresultaten uit het archief aanvullen
+    return merge_archived_fields([existing])[0] if existing else None
+
+
+def _reused_results(existing: dict) -> dict:
+    # Neem afgeronde OCR- en analyse-resultaten van een eerdere foto over; de rest start opnieuw
+    reused = {}
+    if existing.get("ocr", {}).get("status") == "done":
+        reused["ocr"] = existing["ocr"]
+    pipelines = {
+        name: pipeline
+        for name, pipeline in (existing.get("pipelines") or {}).items()
+        if pipeline.get("status") in _FINISHED_PIPELINE_STATUSES
+    }
+    if pipelines:
+        reused["pipelines"] = pipelines
+    return reused
+
+
+def _build_photo_document(user_id: str, original_filename: str, image_data, mime_type: str, location_opt_in: bool, digest: tuple = None, duplicate_policy: str = None):
+    # Lees de metadata, bewaar de bytes in de blob store en stel het foto-document samen (nog niet ingevoegd)
+    # Header en hash in één doorgang; de pixels worden hier nooit gedecodeerd
+    metadata, exif = extract_image_metadata(image_data, mime_type, location_opt_in, filename=original_filename, digest=digest)
+    sha256_hash = metadata["sha256Hash"]
+
+    # Al eerder geüpload? Weigeren of de resultaten van de vorige upload hergebruiken
+    duplicate_policy = duplicate_policy or DEFAULT_DUPLICATE_POLICY
+    existing = find_duplicate_photo(user_id, sha256_hash) if duplicate_policy != "allow" else None
+    if existing and duplicate_policy == "reject":
+        raise DuplicatePhotoError(existing["_id"])
+
+    # De bytes gaan naar de blob store; het document bewaart enkel een referentie
+    # Identieke inhoud deelt dezelfde blob, enkel de referentieteller gaat omhoog
+    # Met een opslagcodec wordt een PNG verliesloos als WebP bewaard (enkel als dat genoeg plaats spaart)
+    encoded = encode_for_storage(image_data) if STORAGE_CODEC != "none" and metadata["mimeType"] == "image/png" else None
+    blob_ref = put_blob(image_data, key=sha256_hash, encoded=encoded)
+    metadata["storageCodec"] = blob_ref.get("codec") or "none"
+
+    return _new_photo_document(user_id, original_filename, blob_ref, metadata, exif, existing)
+
+
+def _new_photo_document(user_id: str, original_filename: str, blob_ref: dict, metadata: dict, exif: dict, existing: dict = None):
+    # Stel een nieuw foto-document samen; bij een duplicaat met de resultaten van de eerdere foto
+    photo = {
+        "userId": ObjectId(user_id),
+        "originalFilename": original_filename,
+        "uploadedAt": datetime.utcnow(),
+        "imageStorage": {
+            "blobRef": blob_ref,
+        },
+        "metadata": metadata,
+        "exif": exif,
+        "ocr": {
+            "status": "uploaded",
+            "extractedText": "",
+            "processedAt": None,
+            "errorMessage": None,
+            "meta": {
+                "textLength": 0,
+                "lineCount": 0,
+                "processingDurationMs": 0,
             },
-            "metadata": metadata,
-            "exif": exif,
-            "ocr": {
-                "status": "uploaded",
-                "extractedText": "",
+        },
+        "pipelines": {
+            "userExtract": {
+                "status": "pending",
+                "resultJson": None,
                 "processedAt": None,
                 "errorMessage": None,
-                "meta": {
-                    "textLength": 0,
-                    "lineCount": 0,
-                    "processingDurationMs": 0,
-                },
             },
-            "pipelines": {
-                "userExtract": {
-                    "status": "pending",
-                    "resultJson": None,
-                    "processedAt": None,
-                    "errorMessage": None,
-                },
-                "adminAnalytics": {
-                    "status": "pending",
-                    "resultJson": None,
-                    "processedAt": None,
-                    "errorMessage": None,
-                },
+            "adminAnalytics": {
+                "status": "pending",
+                "resultJson": None,
+                "processedAt": None,
+                "errorMessage": None,
             },
-        }
+        },
+    }
+
+    if existing:
+        reused = _reused_results(existing)
+        photo["duplicateOf"] = existing["_id"]
+        if "ocr" in reused:
+            photo["ocr"] = reused["ocr"]
+        photo["pipelines"].update(reused.get("pipelines", {}))
 
-        result = photos.insert_one(photo)
+    return photo
+
+
+def save_photo(user_id: str, original_filename: str, image_data, mime_type: str, location_opt_in: bool, digest: tuple = None, duplicate_policy: str = None):
+    # Sla een foto met metadata, EXIF en OCR-status op
+    # image_data zijn bytes of een (gespoold) bestand; digest = (sha256, grootte) indien al bekend
+    try:
+        photo = _build_photo_document(user_id, original_filename, image_data, mime_type, location_opt_in, digest, duplicate_policy)
+
+        try:
+            result = photos.insert_one(photo)
+        except Exception:
+            release_blob(photo["imageStorage"]["blobRef"])
+            raise
         return result.inserted_id
     except Exception as e:
         print(f"Error saving photo {original_filename}: {e}")
@@ -159,15 +165,232 @@ def save_photo(user_id: str, original_filename: str, image_data: bytes, mime_typ
         raise
 
 
-def get_user_photos(user_id: str):
-    # Haal alle foto's van een gebruiker op in omgekeerde datumvolgorde
-    user_photos = photos.find({"userId": ObjectId(user_id)}).sort("uploadedAt", -1)
+def _get_ingest_executor():
+    # Maak de thread pool voor uploads lazy aan (één per proces)
+    global _ingest_executor
+    with _ingest_executor_lock:
+        if _ingest_executor is None:
+            _ingest_executor = ThreadPoolExecutor(max_workers=UPLOAD_INGEST_WORKERS)
+        return _ingest_executor
+
+
+def save_photos_batch(user_id: str, uploads: list, location_opt_in: bool, duplicate_policy: str = None):
+    # Sla meerdere foto's in één keer op: metadata en blob store parallel, daarna één insert_many
+    # uploads: dicts met originalFilename, imageData (bytes of bestand), mimeType en optioneel digest
+    # Geeft per upload (in dezelfde volgorde) {"id": ..., "duplicateOf": ...} of {"error": ...} terug
+    duplicate_policy = duplicate_policy or DEFAULT_DUPLICATE_POLICY
+
+    def prepare(upload):
+        return _build_photo_document(
+            user_id,
+            upload["originalFilename"],
+            upload["imageData"],
+            upload["mimeType"],
+            location_opt_in,
+            upload.get("digest"),
+            duplicate_policy,
+        )
+
+    futures = [_get_ingest_executor().submit(prepare, upload) for upload in uploads]
+
+    results = [None] * len(uploads)
+    documents = []
+    batch_hashes = {}
+    for index, (upload, future) in enumerate(zip(uploads, futures)):
+        try:
+            document = future.result()
+        except DuplicatePhotoError as e:
+            results[index] = {"error": str(e), "rejected": True, "duplicateOf": e.photo_id}
+            continue
+        except Exception as e:
+            print(f"Error preparing photo {upload['originalFilename']}: {e}")
+            results[index] = {"error": str(e), "rejected": isinstance(e, ValueError)}
+            continue
+
+        # Dezelfde afbeelding twee keer in één request: bij "reject" enkel de eerste bewaren
+        sha256_hash = document["metadata"]["sha256Hash"]
+        if duplicate_policy == "reject" and sha256_hash in batch_hashes:
+            release_blob(document["imageStorage"]["blobRef"])
+            results[index] = {"error": "Duplicate file in upload", "rejected": True}
+            continue
+        batch_hashes[sha256_hash] = document
+        documents.append((index, document))
+
+    if documents:
+        failed_positions = {}
+        try:
+            photos.insert_many([document for _index, document in documents], ordered=False)
+        except BulkWriteError as e:
+            failed_positions = {error["index"]: error.get("errmsg", "Insert failed") for error in e.details.get("writeErrors", [])}
+        except Exception as e:
+            failed_positions = {position: str(e) for position in range(len(documents))}
+
+        for position, (index, document) in enumerate(documents):
+            if position in failed_positions:
+                release_blob(document["imageStorage"]["blobRef"])
+                results[index] = {"error": failed_positions[position], "rejected": False}
+            else:
+                results[index] = {"id": document["_id"], "duplicateOf": document.get("duplicateOf")}
+
+    return results
+
+
+def get_known_hashes(user_id: str, hashes: list) -> set:
+    # Welke van deze SHA-256-hashes heeft de gebruiker al als foto in de blob store (via de hash-index)
+    if not hashes:
+        return set()
+    return set(photos.distinct(
+        "metadata.sha256Hash",
+        {
+            "userId": ObjectId(user_id),
+            "metadata.sha256Hash": {"$in": list(hashes)},
+            "imageStorage.blobRef": {"$exists": True},
+        },
+    ))
+
+
+def register_photos_by_hash(user_id: str, entries: list, location_opt_in: bool):
+    # Maak foto's aan voor afbeeldingen die de gebruiker al heeft, zonder de bytes opnieuw te uploaden
+    # Enkel eigen hashes: kennis van een hash is geen bewijs dat je de afbeelding bezit
+    # entries: dicts met sha256Hash en originalFilename; geeft per entry {"id", "duplicateOf"} of {"error"} terug
+    results = [None] * len(entries)
+    documents = []
+    try:
+        for index, entry in enumerate(entries):
+            existing = photos.find_one(
+                {
+                    "userId": ObjectId(user_id),
+                    "metadata.sha256Hash": entry["sha256Hash"],
+                    "imageStorage.blobRef": {"$exists": True},
+                },
+                {"imageStorage.blobRef": 1, "metadata": 1, "exif": 1, "ocr": 1, "pipelines": 1, "archivedAt": 1},
+                sort=[("ocr.processedAt", -1)],
+            )
+            if existing:
+                merge_archived_fields([existing])
+            blob_ref = retain_blob(existing["imageStorage"]["blobRef"]) if existing else None
+            if not blob_ref:
+                results[index] = {"error": "Unknown hash, upload the file instead"}
+                continue
+
+            exif = dict(existing["exif"]) if existing.get("exif") else existing.get("exif")
+            if exif and not location_opt_in:
+                exif.pop("gpsLatitude", None)
+                exif.pop("gpsLongitude", None)
+
+            metadata = dict(existing["metadata"])
+            if blob_ref.get("codec"):
+                metadata["storageCodec"] = blob_ref["codec"]
+
+            documents.append((index, _new_photo_document(user_id, entry["originalFilename"], blob_ref, metadata, exif, existing)))
+    except Exception:
+        # Referenties die al genomen waren niet laten lekken
+        for _index, document in documents:
+            release_blob(document["imageStorage"]["blobRef"])
+        raise
+
+    if documents:
+        # Zoals save_photos_batch: enkel de referenties van documenten die niet ingevoegd werden vrijgeven
+        failed_positions = {}
+        try:
+            photos.insert_many([document for _index, document in documents], ordered=False)
+        except BulkWriteError as e:
+            failed_positions = {error["index"]: error.get("errmsg", "Insert failed") for error in e.details.get("writeErrors", [])}
+        except Exception as e:
+            failed_positions = {position: str(e) for position in range(len(documents))}
+
+        for position, (index, document) in enumerate(documents):
+            if position in failed_positions:
+                release_blob(document["imageStorage"]["blobRef"])
+                results[index] = {"error": failed_positions[position]}
+            else:
+                results[index] = {"id": document["_id"], "duplicateOf": document["duplicateOf"]}
+
+    return results
+
+
+# Velden voor lijst- en statusweergaven; afbeeldingsdata en OCR-meta blijven zo in de database
+_LIST_PROJECTION = {
+    "originalFilename": 1,
+    "uploadedAt": 1,
+    "metadata": 1,
+    "exif": 1,
+    "ocr.status": 1,
+    "ocr.extractedText": 1,
+    "ocr.errorMessage": 1,
+    "archivedAt": 1,
+}
+# Gearchiveerde velden die lijsten uit het archief aanvullen
+_LIST_ARCHIVED_FIELDS = ("ocr.extractedText",)
+
+
+def encode_photo_cursor(photo: dict) -> str:
+    # Cursor = (uploadedAt, _id) van de laatste foto op de pagina, als ondoorzichtige string
+    uploaded_at = photo.get("uploadedAt")
+    raw = f"{uploaded_at.isoformat() if uploaded_at else ''}|{photo['_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_photo_cursor(cursor: str):
+    # Zet een cursor terug om naar (uploadedAt, _id); ValueError bij een ongeldige cursor
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        uploaded_at, photo_id = raw.split("|", 1)
+        return (datetime.fromisoformat(uploaded_at) if uploaded_at else None), ObjectId(photo_id)
+    except Exception:
+        raise ValueError("Invalid cursor") from None
+
+
+def _after_cursor_filter(cursor: str, direction: int) -> dict:
+    # Keyset-voorwaarde voor "alles na deze cursor" in sorteervolgorde (uploadedAt, _id)
+    # Foto's zonder uploadedAt sorteren in MongoDB vóór alle datums en worden apart behandeld
+    uploaded_at, photo_id = decode_photo_cursor(cursor)
+    op = "$gt" if direction == 1 else "$lt"
+
+    if uploaded_at is None:
+        conditions = [{"uploadedAt": None, "_id": {op: photo_id}}]
+        if direction == 1:
+            conditions.append({"uploadedAt": {"$ne": None}})
+    else:
+        conditions = [
+            {"uploadedAt": {op: uploaded_at}},
+            {"uploadedAt": uploaded_at, "_id": {op: photo_id}},
+        ]
+        if direction == -1:
+            conditions.append({"uploadedAt": None})
+    return {"$or": conditions}
+
+
+def _find_photo_page(user_id: str, direction: int, limit: int = None, after: str = None):
+    # Haal foto's op met enkel de lijstvelden, optioneel één pagina na een cursor
+    # Geeft (documenten, volgende cursor of None) terug
+    query = {"userId": ObjectId(user_id)}
+    if after:
+        query.update(_after_cursor_filter(after, direction))
+
+    cursor = photos.find(query, _LIST_PROJECTION).sort([("uploadedAt", direction), ("_id", direction)])
+    if limit is None:
+        return merge_archived_fields(list(cursor), _LIST_ARCHIVED_FIELDS), None
+
+    # Eén extra document ophalen om te weten of er nog een volgende pagina is
+    page = list(cursor.limit(limit + 1))
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_photo_cursor(page[-1])
+    return merge_archived_fields(page, _LIST_ARCHIVED_FIELDS), next_cursor
+
+
+def get_user_photos(user_id: str, limit: int = None, after: str = None):
+    # Haal de foto's van een gebruiker op in omgekeerde datumvolgorde (zonder limit: allemaal)
+    # Geeft (foto's, volgende cursor) terug
+    user_photos, next_cursor = _find_photo_page(user_id, -1, limit, after)
     result = []
     for photo in user_photos:
         try:
             result.append({
                 "id": str(photo["_id"]),
-                "originalFilename": photo.get("originalFilename") or photo.get("filename", "unknown"),
+                "originalFilename": photo.get("originalFilename", "unknown"),
                 "uploadedAt": photo.get("uploadedAt", datetime.utcnow()).isoformat(),
                 "metadata": photo.get("metadata", {}),
                 "exif": photo.get("exif"),
@@ -179,33 +402,145 @@ def get_user_photos(user_id: str):
         except Exception as e:
             print(f"Error processing photo {photo.get('_id')}: {e}")
             continue
-    return result
+    return result, next_cursor
 
 
-def get_photo_by_id(photo_id: str, user_id: str):
-    # Haal een specifieke foto op en controleer eigenaar
+def load_photo_image_data(photo: dict, decode: bool = True) -> bytes:
+    # Geef de ruwe bytes van een foto terug, ongeacht waar ze bewaard worden
+    # decode=False: gehercodeerde blobs in hun opgeslagen vorm laten (volstaat voor alles wat via Pillow leest)
+    image_storage = photo.get("imageStorage") or {}
+    if "blobRef" in image_storage:
+        return read_blob(image_storage["blobRef"], decode=decode)
+    if "imageData" in image_storage:
+        return image_storage["imageData"]
+    return photo.get("imageData")
+
+
+def get_photo_file_info(photo_id: str, user_id: str):
+    # Enkel de velden die nodig zijn om een foto te versturen of een cachevalidatie te beantwoorden, zonder de blob te openen
+    # None als de foto niet bestaat of van een andere gebruiker is
     try:
-        photo = photos.find_one({"_id": ObjectId(photo_id), "userId": ObjectId(user_id)})
-        if photo:
-            if "imageStorage" in photo and "imageData" in photo["imageStorage"]:
-                return {
-                    "imageData": photo["imageStorage"]["imageData"],
-                    "mimeType": photo["metadata"]["mimeType"],
-                }
-            if "imageData" in photo:
-                return {
-                    "imageData": photo["imageData"],
-                    "mimeType": photo.get("mimeType", "image/jpeg"),
-                }
+        photo = photos.find_one(
+            {"_id": ObjectId(photo_id), "userId": ObjectId(user_id)},
+            {"imageStorage.blobRef": 1, "metadata.mimeType": 1, "metadata.sha256Hash": 1, "archivedAt": 1},
+        )
+    except Exception as e:
+        print(f"Error getting photo {photo_id}: {e}")
+        return None
+    if not photo:
+        return None
+
+    return {
+        "_id": photo["_id"],
+        "blobRef": photo.get("imageStorage", {}).get("blobRef"),
+        "sha256Hash": photo.get("metadata", {}).get("sha256Hash"),
+        "mimeType": photo.get("metadata", {}).get("mimeType") or "image/jpeg",
+        "archived": "archivedAt" in photo,
+    }
+
+
+def open_photo_file(info: dict, size: int = None):
+    # "file" is een pad of stream die send_file rechtstreeks kan versturen, zonder de bytes eerst in het geheugen te laden
+    # Met size komt een verkleinde WebP-versie (thumbnail/preview) uit de rendition-cache terug
+    # "sizeBytes" is de lengte als send_file die zelf niet kan bepalen (GridFS-stream)
+    if size:
+        return _get_photo_rendition(info, info["blobRef"], size)
+
+    # Het origineel van een gearchiveerde foto wordt opgevraagd: de foto terug naar de warme laag halen
+    # (thumbnails lezen gewoon uit het archief, zonder terug te zetten)
+    if info.get("archived"):
+        restore_archived_photo(info["_id"])
+
+    blob_ref = info["blobRef"]
+    if blob_ref and blob_ref.get("codec"):
+        # Gehercodeerde blob: het teruggezette origineel uit de schijfcache, zodat niet elke request opnieuw decodeert
+        file = open_decoded_original(blob_ref["key"], blob_ref["codec"], lambda: read_blob(blob_ref))
+        return {
+            "file": file,
+            "mimeType": info["mimeType"],
+            "sizeBytes": _stream_size(file),
+        }
+
+    if blob_ref:
+        file = open_blob(blob_ref)
+        return {
+            "file": file,
+            "mimeType": info["mimeType"],
+            "sizeBytes": getattr(file, "length", None),
+        }
+
+    # Nog niet gemigreerde foto: bytes staan nog in het document
+    image_data = load_photo_image_data(photos.find_one({"_id": info["_id"]}))
+    if image_data is None:
         return None
+    return {"file": io.BytesIO(image_data), "mimeType": info["mimeType"]}
+
+
+def _stream_size(file) -> int:
+    position = file.tell()
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+def get_photo_by_id(photo_id: str, user_id: str, size: int = None):
+    # Haal een specifieke foto op en controleer eigenaar
+    try:
+        info = get_photo_file_info(photo_id, user_id)
+        return open_photo_file(info, size) if info else None
     except Exception as e:
         print(f"Error getting photo {photo_id}: {e}")
         return None
 
 
+def _get_photo_rendition(info: dict, blob_ref: dict, size: int):
+    # Het origineel wordt enkel geladen als de rendition nog niet in de cache zit
+    def load_original():
+        if blob_ref:
+            return read_blob(blob_ref, decode=False)
+        return load_photo_image_data(photos.find_one({"_id": info["_id"]}), decode=False)
+
+    sha256_hash = info["sha256Hash"]
+    if not sha256_hash:
+        # Oude foto zonder hash: eerst de bytes laden om een cachesleutel te hebben
+        image_data = load_original()
+        if image_data is None:
+            return None
+        sha256_hash = calculate_sha256(image_data)
+        load_original = lambda: image_data
+
+    return {
+        "file": io.BytesIO(get_rendition(sha256_hash, size, load_original)),
+        "mimeType": "image/webp",
+    }
+
+
 def get_photos_for_processing(user_id: str):
-    # Selecteer foto's die nog verwerkt moeten worden
-    return list(photos.find({"userId": ObjectId(user_id), "ocr.status": {"$in": ["uploaded", "error"]}}))
+    # Selecteer foto's die nog verwerkt moeten worden: enkel id, status en grootte, de afbeeldingen blijven in de store
+    # received/extracting zitten er ook bij: foto's zonder actieve job (bv. na een herstart) worden zo opnieuw ingepland
+    return list(photos.find(
+        {"userId": ObjectId(user_id), "ocr.status": {"$in": ["uploaded", "error", "received", "extracting"]}},
+        {"ocr.status": 1, "metadata.fileSizeBytes": 1},
+    ))
+
+
+def mark_photos_received(photo_ids: list) -> int:
+    # Zet foto's die nog niet in verwerking zijn in één keer op "received"
+    result = photos.update_many(
+        {"_id": {"$in": [ObjectId(photo_id) for photo_id in photo_ids]}, "ocr.status": {"$in": ["uploaded", "error"]}},
+        {"$set": {"ocr.status": "received"}},
+    )
+    return result.modified_count
+
+
+def get_photo_for_ocr(photo_id: str):
+    # Haal één foto op vlak voor de OCR-verwerking, met enkel wat de worker nodig heeft
+    # Verwijderde foto's worden niet meer verwerkt
+    return photos.find_one(
+        {"_id": ObjectId(photo_id), "deletedAt": {"$exists": False}},
+        {"imageStorage": 1, "imageData": 1, "metadata.sha256Hash": 1},
+    )
 
 
 def update_photo_status(photo_id: str, status: str, extracted_text: str = None, error_message: str = None, processing_meta: dict = None):
@@ -223,15 +558,16 @@ def update_photo_status(photo_id: str, status: str, extracted_text: str = None,
     photos.update_one({"_id": ObjectId(photo_id)}, {"$set": update_data})
 
 
-def get_photos_status(user_id: str):
-    # Haal statusoverzicht van foto's op voor een gebruiker
-    user_photos = photos.find({"userId": ObjectId(user_id)}).sort("uploadedAt", 1)
+def get_photos_status(user_id: str, limit: int = None, after: str = None):
+    # Haal statusoverzicht van foto's op voor een gebruiker (oudste eerst, zonder limit: allemaal)
+    # Geeft (statussen, volgende cursor) terug
+    user_photos, next_cursor = _find_photo_page(user_id, 1, limit, after)
     result = []
     for photo in user_photos:
         try:
             result.append({
                 "id": str(photo["_id"]),
-                "originalFilename": photo.get("originalFilename") or photo.get("filename") or photo.get("original_name") or "unknown",
+                "originalFilename": photo.get("originalFilename", "unknown"),
                 "status": photo.get("ocr", {}).get("status", "unknown"),
                 "extractedText": photo.get("ocr", {}).get("extractedText"),
                 "errorMessage": photo.get("ocr", {}).get("errorMessage"),
@@ -239,41 +575,92 @@ def get_photos_status(user_id: str):
         except Exception as e:
             print(f"Error processing photo status {photo.get('_id')}: {e}")
             continue
-    return result
+    return result, next_cursor
 
 
 def delete_user_photos(user_id: str):
-    # Verwijder alle foto's van een gebruiker
-    result = photos.delete_many({"userId": ObjectId(user_id)})
-    return result.deleted_count
-
+    # Markeer alle foto's van een gebruiker als verwijderd; het echte opruimen gebeurt in de achtergrond (photo_purge)
+    # userId verhuist naar deletedUserId, zodat alle queries per gebruiker de foto's meteen niet meer zien
+    result = photos.update_many(
+        {"userId": ObjectId(user_id)},
+        {
+            "$set": {"deletedUserId": ObjectId(user_id), "deletedAt": datetime.utcnow()},
+            "$unset": {"userId": ""},
+        },
+    )
+    return result.modified_count
+
+
+def recompress_photo_blobs(batch_size: int = 50, pause_seconds: float = 0.1, codec: str = None):
+    # Hercodeer bestaande blobs met de opslagcodec; foto's zonder metadata.storageCodec zijn nog niet bekeken
+    codec = codec or STORAGE_CODEC
+    if codec == "none":
+        return 0
+
+    # Enkel PNG komt in aanmerking; de rest in één keer als bekeken markeren
+    photos.update_many(
+        {"metadata.storageCodec": {"$exists": False}, "imageStorage.blobRef": {"$exists": True}, "metadata.mimeType": {"$ne": "image/png"}},
+        {"$set": {"metadata.storageCodec": "none"}},
+    )
+
+    pending_filter = {
+        "metadata.storageCodec": {"$exists": False},
+        "imageStorage.blobRef": {"$exists": True},
+        "archivedAt": {"$exists": False},
+    }
+    recompressed_count = 0
+    while True:
+        batch = list(photos.find(pending_filter, {"imageStorage.blobRef": 1}).limit(batch_size))
+        if not batch:
+            break
+
+        for photo in batch:
+            blob_ref = photo["imageStorage"]["blobRef"]
+            new_ref = None
+            if not blob_ref.get("codec"):
+                try:
+                    encoded = encode_for_storage(read_blob(blob_ref), codec)
+                    if encoded:
+                        new_ref = set_blob_codec(blob_ref["key"], *encoded)
+                except FileNotFoundError:
+                    pass
 
-def migrate_missing_original_filenames():
-    # Vul ontbrekende originalFilename velden op basis van fallback
+            if new_ref:
+                recompressed_count += 1
+                # Alle foto's die deze blob delen tegelijk bijwerken
+                photos.update_many(
+                    {"imageStorage.blobRef.key": blob_ref["key"]},
+                    {"$set": {"imageStorage.blobRef.codec": new_ref["codec"], "metadata.storageCodec": new_ref["codec"]}},
+                )
+            else:
+                photos.update_many(
+                    {"imageStorage.blobRef.key": blob_ref["key"], "metadata.storageCodec": {"$exists": False}},
+                    {"$set": {"metadata.storageCodec": blob_ref.get("codec") or "none"}},
+                )
+
+        # Korte pauze tussen batches zodat de database ook nog voor gebruikers beschikbaar blijft
+        time.sleep(pause_seconds)
+
+    print(f"Recompression complete: re-encoded {recompressed_count} blobs with {codec}")
+    return recompressed_count
+
+
+def start_photo_recompression():
+    # Start recompress_photo_blobs in de achtergrond; False als er al een loopt
+    global _recompression_thread
+    with _recompression_lock:
+        if _recompression_thread is not None and _recompression_thread.is_alive():
+            return False
+        _recompression_thread = threading.Thread(target=_run_photo_recompression, daemon=True)
+        _recompression_thread.start()
+        return True
+
+
+def _run_photo_recompression():
     try:
-        missing_photos = photos.find({"originalFilename": {"$exists": False}})
-        updated_count = 0
-
-        for photo in missing_photos:
-            fallback_name = (
-                photo.get("filename") or
-                photo.get("original_name") or
-                f"photo_{photo['_id']}"
-            )
-
-            photos.update_one(
-                {"_id": photo["_id"]},
-                {"$set": {"originalFilename": fallback_name}}
-            )
-            updated_count += 1
-
-        print(f"Migration complete: updated {updated_count} photos with originalFilename")
-        return updated_count
+        recompress_photo_blobs()
     except Exception as e:
-        print(f"Migration error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise
+        print(f"Recompression failed: {e}")
 
 
 def update_photo_pipeline_result(photo_id: str, pipeline_name: str, result_json: dict):
@@ -0,0 +1,223 @@
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+
+# Beschikbare formaten (langste zijde in pixels) voor thumbnails en previews
+RENDITION_SIZES = tuple(int(size) for size in os.environ.get("PHOTO_RENDITION_SIZES", "128,512").split(",") if size)
+RENDITION_QUALITY = int(os.environ.get("PHOTO_RENDITION_QUALITY", "80"))
+# Cache in twee lagen: een kleine in het geheugen per proces, een grotere op schijf gedeeld tussen processen
+RENDITION_MEMORY_CACHE_BYTES = int(os.environ.get("RENDITION_MEMORY_CACHE_BYTES", str(32 * 1024 * 1024)))
+RENDITION_DISK_CACHE_BYTES = int(os.environ.get("RENDITION_DISK_CACHE_BYTES", str(1024 * 1024 * 1024)))
+RENDITION_CACHE_PATH = os.environ.get(
+    "RENDITION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "..", "data", "renditions"),
+)
+
+_memory_cache = OrderedDict()
+_memory_cache_bytes = 0
+_memory_cache_lock = threading.Lock()
+
+# Geschatte grootte van de schijfcache; None tot de map één keer overlopen is
+_disk_cache_bytes = None
+_disk_cache_lock = threading.Lock()
+
+# Eén lock per rendition die gemaakt wordt, zodat gelijktijdige requests het origineel maar één keer decoderen
+_render_locks = {}
+_render_locks_guard = threading.Lock()
+
+
+def is_valid_rendition_size(size: int) -> bool:
+    return size in RENDITION_SIZES
+
+
+def _cache_key(sha256_hash: str, size: int) -> str:
+    return f"{sha256_hash}_{size}"
+
+
+def _disk_path(key: str, extension: str = "webp") -> str:
+    return os.path.join(RENDITION_CACHE_PATH, key[:2], f"{key}.{extension}")
+
+
+def _memory_get(key: str):
+    with _memory_cache_lock:
+        data = _memory_cache.get(key)
+        if data is not None:
+            _memory_cache.move_to_end(key)
+        return data
+
+
+def _memory_put(key: str, data: bytes):
+    # Voeg toe en verwijder de minst recent gebruikte items tot we onder het budget zitten
+    global _memory_cache_bytes
+    if len(data) > RENDITION_MEMORY_CACHE_BYTES:
+        return
+    with _memory_cache_lock:
+        if key in _memory_cache:
+            return
+        _memory_cache[key] = data
+        _memory_cache_bytes += len(data)
+        while _memory_cache_bytes > RENDITION_MEMORY_CACHE_BYTES:
+            _old_key, old_data = _memory_cache.popitem(last=False)
+            _memory_cache_bytes -= len(old_data)
+
+
+def _disk_get(key: str):
+    path = _disk_path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    # mtime bijwerken: het opruimen van de schijfcache gebeurt op "minst recent gebruikt"
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+
+def _scan_disk_cache():
+    # Alle bestanden van de schijfcache met (mtime, grootte, pad)
+    entries = []
+    for root, _dirs, files in os.walk(RENDITION_CACHE_PATH):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _evict_disk_cache():
+    # Verwijder de oudste bestanden tot de schijfcache op 90% van het budget zit
+    global _disk_cache_bytes
+    entries = sorted(_scan_disk_cache())
+    total = sum(size for _mtime, size, _path in entries)
+    target = RENDITION_DISK_CACHE_BYTES * 0.9
+    for _mtime, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            pass
+    _disk_cache_bytes = total
+
+
+def _disk_put(key: str, data: bytes, extension: str = "webp"):
+    # Atomisch schrijven (tijdelijk bestand + hernoemen), daarna het budget bewaken
+    global _disk_cache_bytes
+    path = _disk_path(key, extension)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".render-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    with _disk_cache_lock:
+        if _disk_cache_bytes is None:
+            _disk_cache_bytes = sum(size for _mtime, size, _path in _scan_disk_cache())
+        else:
+            _disk_cache_bytes += len(data)
+        if _disk_cache_bytes > RENDITION_DISK_CACHE_BYTES:
+            _evict_disk_cache()
+
+
+def render_rendition(image_data: bytes, size: int) -> bytes:
+    # Verklein een afbeelding tot maximaal size x size pixels als WebP, rechtgezet volgens de EXIF-oriëntatie
+    with Image.open(io.BytesIO(image_data)) as img:
+        # JPEG kan al verkleind decoderen: veel sneller en zuiniger dan eerst de volledige afbeelding
+        img.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size))
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+
+        output = io.BytesIO()
+        img.save(output, "WEBP", quality=RENDITION_QUALITY, method=4)
+        return output.getvalue()
+
+
+def _render_lock(key: str) -> threading.Lock:
+    with _render_locks_guard:
+        return _render_locks.setdefault(key, threading.Lock())
+
+
+def _drop_render_lock(key: str, lock: threading.Lock):
+    with _render_locks_guard:
+        if _render_locks.get(key) is lock and not lock.locked():
+            _render_locks.pop(key, None)
+
+
+def _open_cached_file(path: str):
+    # Open een bestand uit de schijfcache (en markeer het als recent gebruikt); None als het er niet (meer) is
+    try:
+        file = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return file
+
+
+def open_decoded_original(sha256_hash: str, codec: str, decode_original):
+    # Open het naar het oorspronkelijke formaat teruggezette origineel van een gehercodeerde blob (PNG)
+    # Enkel op schijf gecachet: originelen zijn te groot voor de geheugencache, en zo blijven de bytes stabiel
+    # decode_original() wordt enkel opgeroepen als het origineel nog niet in de cache zit; geeft een open bestand terug
+    key = f"{sha256_hash}_{codec}"
+    path = _disk_path(key, "png")
+    file = _open_cached_file(path)
+    if file is not None:
+        return file
+
+    lock = _render_lock(key)
+    try:
+        with lock:
+            file = _open_cached_file(path)
+            if file is not None:
+                return file
+            data = decode_original()
+            try:
+                _disk_put(key, data, "png")
+            except OSError as e:
+                print(f"Warning: Failed to store decoded original {key} on disk: {e}")
+            # Het bestand kan meteen weer uit de cache verdrongen zijn: dan rechtstreeks uit het geheugen
+            return _open_cached_file(path) or io.BytesIO(data)
+    finally:
+        _drop_render_lock(key, lock)
+
+
+def get_rendition(sha256_hash: str, size: int, load_image_data) -> bytes:
+    # Geef de verkleinde versie van een afbeelding; load_image_data() wordt enkel opgeroepen als ze nog niet in de cache zit
+    key = _cache_key(sha256_hash, size)
+    data = _memory_get(key)
+    if data is not None:
+        return data
+
+    lock = _render_lock(key)
+    try:
+        with lock:
+            data = _memory_get(key) or _disk_get(key)
+            if data is None:
+                data = render_rendition(load_image_data(), size)
+                try:
+                    _disk_put(key, data)
+                except OSError as e:
+                    print(f"Warning: Failed to store rendition {key} on disk: {e}")
+            _memory_put(key, data)
+            return data
+    finally:
+        _drop_render_lock(key, lock)
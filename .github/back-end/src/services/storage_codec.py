@@ -0,0 +1,77 @@
+import io
+import os
+from PIL import Image
+
+# Opslagcodec voor originelen: "none" (byte-voor-byte) of "webp-lossless" (PNG's verliesloos als WebP bewaren)
+# De identiteit van een afbeelding blijft de SHA-256 van het origineel
+STORAGE_CODEC = os.environ.get("STORAGE_CODEC", "none")
+# Enkel hercoderen als het minstens dit deel (0.1 = 10%) kleiner wordt
+STORAGE_CODEC_MIN_SAVING = float(os.environ.get("STORAGE_CODEC_MIN_SAVING", "0.1"))
+
+STORAGE_CODECS = ("none", "webp-lossless")
+
+# Modi die WebP verliesloos kan bewaren (na eventueel uitbreiden naar RGB/RGBA); 16-bit beelden blijven ongemoeid
+_LOSSLESS_MODES = {"1": "RGB", "L": "RGB", "LA": "RGBA", "P": None, "RGB": "RGB", "RGBA": "RGBA"}
+
+
+def _open_source(data):
+    # Stream en grootte van bytes of een (seekable) bestand, zonder een gespoold bestand in het geheugen te lezen
+    if isinstance(data, (bytes, bytearray)):
+        return io.BytesIO(data), len(data)
+    data.seek(0, os.SEEK_END)
+    size = data.tell()
+    data.seek(0)
+    return data, size
+
+
+def encode_for_storage(data, codec: str = None, force: bool = False):
+    # Hercodeer een origineel voor opslag; geeft (codec, bytes) terug of None als het origineel zelf bewaard moet worden
+    # force: altijd hercoderen, ook als het weinig oplevert (de blob heeft deze codec al)
+    codec = codec or STORAGE_CODEC
+    if codec != "webp-lossless":
+        return None
+
+    source, original_size = _open_source(data)
+    try:
+        with Image.open(source) as img:
+            # Enkel PNG is verliesloos; animaties en 16-bit beelden laten we met rust
+            if img.format != "PNG" or getattr(img, "n_frames", 1) > 1 or img.mode not in _LOSSLESS_MODES:
+                return None
+
+            target_mode = _LOSSLESS_MODES[img.mode] or ("RGBA" if "transparency" in img.info else "RGB")
+            converted = img.convert(target_mode) if img.mode != target_mode else img
+
+            output = io.BytesIO()
+            converted.save(
+                output,
+                "WEBP",
+                lossless=True,
+                quality=100,
+                method=4,
+                icc_profile=img.info.get("icc_profile"),
+                exif=img.info.get("exif") or b"",
+            )
+    except Exception as e:
+        print(f"Warning: Failed to encode image for storage: {e}")
+        return None
+
+    encoded = output.getvalue()
+    if not force and len(encoded) > original_size * (1 - STORAGE_CODEC_MIN_SAVING):
+        return None
+    return codec, encoded
+
+
+def decode_from_storage(data: bytes, codec: str) -> bytes:
+    # Zet opgeslagen bytes terug om naar het oorspronkelijke formaat (PNG), met dezelfde pixels
+    if not codec or codec == "none":
+        return data
+
+    with Image.open(io.BytesIO(data)) as img:
+        output = io.BytesIO()
+        save_options = {}
+        if img.info.get("icc_profile"):
+            save_options["icc_profile"] = img.info["icc_profile"]
+        if img.info.get("exif"):
+            save_options["exif"] = img.info["exif"]
+        img.save(output, "PNG", compress_level=3, **save_options)
+        return output.getvalue()
@@ -0,0 +1,285 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from db import upload_sessions
+from services.photos import save_photos_batch
+
+# Map met de deelbestanden van lopende uploads (gedeeld tussen alle webprocessen)
+UPLOAD_SESSION_PATH = os.environ.get(
+    "UPLOAD_SESSION_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "..", "data", "upload-sessions"),
+)
+# Hoe lang een sessie zonder activiteit blijft bestaan
+UPLOAD_SESSION_TTL_SECONDS = int(os.environ.get("UPLOAD_SESSION_TTL_SECONDS", str(24 * 3600)))
+# Aangeraden en maximale grootte van één chunk
+UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", str(4 * 1024 * 1024)))
+UPLOAD_MAX_CHUNK_BYTES = int(os.environ.get("UPLOAD_MAX_CHUNK_BYTES", str(16 * 1024 * 1024)))
+
+# Een chunk die langer dan dit bezig is, geldt als afgebroken en mag opnieuw verstuurd worden
+_WRITE_LOCK_SECONDS = 120
+# Deelbestanden van verlopen sessies worden hooguit zo vaak opgeruimd
+_PURGE_INTERVAL_SECONDS = 600
+_last_purge = 0.0
+
+
+class UploadSessionError(Exception):
+    # Fout in het uploadprotocol; status is de HTTP-status voor de client
+    def __init__(self, message: str, status: int = 400, session: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.session = session
+
+
+def _session_object_id(session_id: str) -> ObjectId:
+    try:
+        return ObjectId(session_id)
+    except Exception:
+        raise UploadSessionError("Upload session not found or expired", 404) from None
+
+
+def _part_path(session_id) -> str:
+    return os.path.join(UPLOAD_SESSION_PATH, f"{session_id}.part")
+
+
+def _expires_at(now: datetime) -> datetime:
+    return now + timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)
+
+
+def create_upload_session(user_id: str, original_filename: str, mime_type: str, total_bytes: int,
+                          sha256_hash: str = None, location_opt_in: bool = False, duplicate_policy: str = None) -> dict:
+    # Start een hervatbare upload; de client stuurt daarna chunks vanaf offset 0
+    purge_expired_upload_parts()
+
+    now = datetime.utcnow()
+    session = {
+        "_id": ObjectId(),
+        "userId": ObjectId(user_id),
+        "originalFilename": original_filename,
+        "mimeType": mime_type,
+        "totalBytes": total_bytes,
+        "receivedBytes": 0,
+        "sha256Hash": sha256_hash,
+        "locationOptIn": location_opt_in,
+        "duplicatePolicy": duplicate_policy,
+        "status": "open",
+        "writeLockId": None,
+        "writeLockExpiresAt": None,
+        "createdAt": now,
+        "updatedAt": now,
+        "expiresAt": _expires_at(now),
+    }
+
+    os.makedirs(UPLOAD_SESSION_PATH, exist_ok=True)
+    open(_part_path(session["_id"]), "wb").close()
+    upload_sessions.insert_one(session)
+    return session
+
+
+def get_upload_session(session_id: str, user_id: str):
+    # Haal een sessie van deze gebruiker op (None als ze niet bestaat of verlopen is)
+    try:
+        session = upload_sessions.find_one({"_id": _session_object_id(session_id), "userId": ObjectId(user_id)})
+    except UploadSessionError:
+        return None
+    if session and session["expiresAt"] < datetime.utcnow():
+        return None
+    return session
+
+
+def _lock_session(session_id: str, user_id: str, query: dict, status: str):
+    # Zet een sessie atomisch in een tussentoestand zodat gelijktijdige requests elkaar niet overschrijven
+    now = datetime.utcnow()
+    return upload_sessions.find_one_and_update(
+        {
+            "_id": _session_object_id(session_id),
+            "userId": ObjectId(user_id),
+            "expiresAt": {"$gt": now},
+            "$or": [
+                {"status": "open"},
+                {"status": {"$in": ["writing", "finalizing"]}, "writeLockExpiresAt": {"$lt": now}},
+            ],
+            **query,
+        },
+        {"$set": {
+            "status": status,
+            "writeLockId": ObjectId(),
+            "writeLockExpiresAt": now + timedelta(seconds=_WRITE_LOCK_SECONDS),
+        }},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _unlock_session(session: dict, set_fields: dict = None, inc_fields: dict = None):
+    # Geef een vergrendelde sessie terug vrij; None als intussen iemand anders de lock overnam
+    update = {"$set": {"status": "open", "writeLockId": None, "writeLockExpiresAt": None, **(set_fields or {})}}
+    if inc_fields:
+        update["$inc"] = inc_fields
+    return upload_sessions.find_one_and_update(
+        {"_id": session["_id"], "writeLockId": session["writeLockId"]},
+        update,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _lock_failure(session_id: str, user_id: str, offset: int = None):
+    # Leg uit waarom een sessie niet vergrendeld kon worden
+    session = get_upload_session(session_id, user_id)
+    if not session:
+        return UploadSessionError("Upload session not found or expired", 404)
+    if session["status"] == "done":
+        return UploadSessionError("Upload session is already finalized", 409, session)
+    if session["status"] != "open":
+        return UploadSessionError("Upload session is busy, retry shortly", 409, session)
+    if offset is not None and offset != session["receivedBytes"]:
+        return UploadSessionError(f"Expected offset {session['receivedBytes']}", 409, session)
+    return UploadSessionError("Upload session changed, retry", 409, session)
+
+
+def write_upload_chunk(session_id: str, user_id: str, offset: int, stream, content_length: int = None) -> dict:
+    # Schrijf één chunk op de gegeven offset; enkel de eerstvolgende offset wordt aanvaard
+    # Een verloren antwoord kan de client zo veilig opnieuw sturen: GET de sessie en ga verder vanaf receivedBytes
+    session = _lock_session(session_id, user_id, {"receivedBytes": offset}, "writing")
+    if not session:
+        raise _lock_failure(session_id, user_id, offset)
+
+    remaining = session["totalBytes"] - offset
+    written = 0
+    try:
+        if content_length is not None and content_length > min(remaining, UPLOAD_MAX_CHUNK_BYTES):
+            raise UploadSessionError("Chunk is larger than allowed", 413)
+
+        with open(_part_path(session["_id"]), "r+b") as f:
+            # Resten van een afgebroken poging op deze offset weggooien
+            f.seek(offset)
+            f.truncate()
+            while True:
+                block = stream.read(1024 * 1024)
+                if not block:
+                    break
+                written += len(block)
+                if written > min(remaining, UPLOAD_MAX_CHUNK_BYTES):
+                    raise UploadSessionError("Chunk is larger than allowed", 413)
+                f.write(block)
+    except Exception:
+        # Sessie vrijgeven op de oude offset; het deelbestand wordt bij een nieuwe poging ingekort
+        _unlock_session(session)
+        raise
+
+    now = datetime.utcnow()
+    updated = _unlock_session(session, {"updatedAt": now, "expiresAt": _expires_at(now)}, {"receivedBytes": written})
+    if not updated:
+        raise UploadSessionError("Chunk took too long and was superseded, check the offset and retry", 409)
+    return updated
+
+
+def _file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def finalize_upload_session(session_id: str, user_id: str):
+    # Rond een volledige upload af via hetzelfde ingest-pad als POST /api/photos (save_photos_batch)
+    # Geeft (sessie, resultaat) terug; het resultaat blijft bewaard zodat een herhaalde finalize hetzelfde antwoord krijgt
+    session = get_upload_session(session_id, user_id)
+    if not session:
+        raise UploadSessionError("Upload session not found or expired", 404)
+    if session["status"] == "done":
+        return session, session["result"]
+    if session["receivedBytes"] != session["totalBytes"]:
+        raise UploadSessionError(f"Upload is not complete: {session['receivedBytes']} of {session['totalBytes']} bytes received", 409, session)
+
+    session = _lock_session(session_id, user_id, {"receivedBytes": session["totalBytes"]}, "finalizing")
+    if not session:
+        raise _lock_failure(session_id, user_id)
+
+    path = _part_path(session["_id"])
+    try:
+        sha256_hash = _file_sha256(path)
+        if session.get("sha256Hash") and session["sha256Hash"] != sha256_hash:
+            discard_upload_session(session_id, user_id, force=True)
+            raise UploadSessionError("Uploaded data does not match sha256Hash", 422)
+
+        with open(path, "rb") as f:
+            result = save_photos_batch(
+                str(session["userId"]),
+                [{
+                    "originalFilename": session["originalFilename"],
+                    "imageData": f,
+                    "mimeType": session["mimeType"],
+                    "digest": (sha256_hash, session["totalBytes"]),
+                }],
+                session["locationOptIn"],
+                session.get("duplicatePolicy"),
+            )[0]
+    except UploadSessionError:
+        raise
+    except Exception:
+        _unlock_session(session)
+        raise
+
+    if "id" not in result and not result.get("rejected"):
+        # Serverfout bij het opslaan: de sessie blijft open zodat finalize opnieuw geprobeerd kan worden
+        _unlock_session(session)
+        return session, result
+
+    # Afgerond: deelbestand weg, het resultaat blijft tot de sessie verloopt
+    upload_sessions.update_one(
+        {"_id": session["_id"], "writeLockId": session["writeLockId"]},
+        {"$set": {"status": "done", "result": result, "writeLockId": None, "writeLockExpiresAt": None, "updatedAt": datetime.utcnow()}},
+    )
+    if os.path.exists(path):
+        os.unlink(path)
+    return session, result
+
+
+def discard_upload_session(session_id: str, user_id: str, force: bool = False) -> bool:
+    # Verwijder een sessie en haar deelbestand (force: ook als ze vergrendeld is)
+    try:
+        query = {"_id": _session_object_id(session_id), "userId": ObjectId(user_id)}
+    except UploadSessionError:
+        return False
+    if not force:
+        query["status"] = {"$in": ["open", "done"]}
+    deleted = upload_sessions.find_one_and_delete(query)
+    if not deleted:
+        return False
+    if os.path.exists(_part_path(deleted["_id"])):
+        os.unlink(_part_path(deleted["_id"]))
+    return True
+
+
+def purge_expired_upload_parts(force: bool = False) -> int:
+    # Ruim deelbestanden op waarvan de sessie verlopen is; de TTL-index verwijdert enkel de documenten
+    global _last_purge
+    if not force and time.monotonic() - _last_purge < _PURGE_INTERVAL_SECONDS:
+        return 0
+    _last_purge = time.monotonic()
+
+    if not os.path.isdir(UPLOAD_SESSION_PATH):
+        return 0
+
+    now = datetime.utcnow()
+    cutoff = time.time() - UPLOAD_SESSION_TTL_SECONDS
+    removed = 0
+    for name in os.listdir(UPLOAD_SESSION_PATH):
+        if not name.endswith(".part"):
+            continue
+        path = os.path.join(UPLOAD_SESSION_PATH, name)
+        try:
+            session_id = ObjectId(name[:-len(".part")])
+        except Exception:
+            continue
+
+        session = upload_sessions.find_one({"_id": session_id}, {"expiresAt": 1})
+        expired = session["expiresAt"] < now if session else os.path.getmtime(path) < cutoff
+        if expired:
+            upload_sessions.delete_one({"_id": session_id})
+            os.unlink(path)
+            removed += 1
+    return removed
@@ -38,3 +38,18 @@ def create_user(email: str, password: str, is_admin: bool = False):
     }
     result = users.insert_one(user)
     return result.inserted_id
+
+
+def get_user_ocr_language(user_id: str):
+    # Haal het gekozen OCR-taalprofiel van een gebruiker op (None = serverstandaard)
+    try:
+        user = users.find_one({"_id": ObjectId(user_id)}, {"ocrLanguage": 1})
+        return user.get("ocrLanguage") if user else None
+    except Exception:
+        return None
+
+
+def set_user_ocr_language(user_id: str, language_profile: str) -> bool:
+    # Bewaar het OCR-taalprofiel van een gebruiker
+    result = users.update_one({"_id": ObjectId(user_id)}, {"$set": {"ocrLanguage": language_profile}})
+    return result.matched_count > 0
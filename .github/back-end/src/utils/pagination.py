@@ -0,0 +1,25 @@
+from flask import request, jsonify
+
+# Bovengrens voor ?limit=
+MAX_PAGE_SIZE = 500
+
+
+def get_page_args(req: request):
+    # Lees ?limit= en ?after= voor keyset-paginatie; zonder limit wordt alles teruggegeven
+    # Geeft (limit, after, fout-response) terug
+    limit = req.args.get("limit")
+    after = req.args.get("after") or None
+
+    if limit is None:
+        if after:
+            return None, None, (jsonify({"error": "after requires limit"}), 400)
+        return None, None, None
+
+    try:
+        limit = int(limit)
+    except ValueError:
+        return None, None, (jsonify({"error": "limit must be an integer"}), 400)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return None, None, (jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400)
+
+    return limit, after, None
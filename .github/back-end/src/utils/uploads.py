@@ -0,0 +1,53 @@
+import hashlib
+import os
+from tempfile import SpooledTemporaryFile
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Maximale grootte van één geüpload bestand en van een volledige request
+UPLOAD_MAX_FILE_BYTES = int(os.environ.get("UPLOAD_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.environ.get("UPLOAD_MAX_REQUEST_BYTES", str(1024 * 1024 * 1024)))
+# Vanaf deze grootte gaat een upload naar een tijdelijk bestand in plaats van het geheugen
+UPLOAD_SPOOL_THRESHOLD = int(os.environ.get("UPLOAD_SPOOL_THRESHOLD", str(1024 * 1024)))
+
+
+class HashingSpooledFile(SpooledTemporaryFile):
+    # Tijdelijk bestand voor één upload dat de SHA-256 en grootte bijhoudt terwijl de multipart-body binnenkomt
+
+    def __init__(self, max_file_bytes: int = UPLOAD_MAX_FILE_BYTES):
+        super().__init__(max_size=UPLOAD_SPOOL_THRESHOLD, mode="w+b")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.max_file_bytes = max_file_bytes
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_file_bytes:
+            raise RequestEntityTooLarge(f"File exceeds the maximum size of {self.max_file_bytes} bytes")
+        self.sha256.update(data)
+        return super().write(data)
+
+
+class UploadRequest(Request):
+    # Request-klasse van de app: bestanden worden gestreamd, gehasht en boven de drempel naar schijf gespoold
+    # De limiet per request komt uit MAX_CONTENT_LENGTH in de app-config
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpooledFile()
+
+
+def get_upload_digest(file):
+    # Geef (sha256, grootte) van een geüpload bestand terug zonder het opnieuw te lezen
+    # Voor streams die niet via UploadRequest kwamen wordt in blokken gelezen
+    stream = file.stream
+    if isinstance(stream, HashingSpooledFile):
+        return stream.sha256.hexdigest(), stream.size
+
+    sha256 = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        sha256.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return sha256.hexdigest(), size